@@ -6,12 +6,13 @@ from app.api.comments.model import Comment
 from app.api.users.dependency import CurrentUser
 from app.database import Database
 from app.utils.models.py_object_id import PyObjectId
+from app.utils.soft_delete import live
 
 
 async def _my_comment(
     comment_id: PyObjectId, db: Database, current_user: CurrentUser
 ) -> Comment:
-    doc = await db.comments.find_one({"_id": comment_id, "deleted": {"$ne": True}})
+    doc = await db.comments.find_one(live({"_id": comment_id}))
     if not doc:
         raise HTTPException(404, "Comment not found")
 
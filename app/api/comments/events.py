@@ -0,0 +1,128 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Annotated, Optional
+
+from fastapi import Depends, Request
+
+from app.api.comments.model import CommentEvent
+from app.utils.models.py_object_id import PyObjectId
+
+
+class Subscription:
+    """
+    Events of one (team_id, endpoint_id) feed, buffered for one connection.
+    """
+
+    def __init__(self, broker: "CommentBroker", team_id: PyObjectId, endpoint_id: str):
+        self.broker = broker
+        self.team_id = team_id
+        self.endpoint_id = endpoint_id
+        self.overflowed = False
+        self._queue: asyncio.Queue[Optional[CommentEvent]] = asyncio.Queue(
+            broker.queue_size
+        )
+
+    def offer(self, event: CommentEvent) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop it instead of buffering without bound,
+            # the client reconnects and reloads the page it missed
+            self.overflowed = True
+            self.broker.unsubscribe(self)
+            self._queue.get_nowait()
+            self._queue.put_nowait(None)
+
+    async def get(self) -> Optional[CommentEvent]:
+        """
+        Next event, None once the subscription was dropped for overflowing.
+        """
+        return await self._queue.get()
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.broker.unsubscribe(self)
+
+
+class CommentBroker(ABC):
+    """
+    Fans comment events out to the live feed subscribers.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+
+    @abstractmethod
+    async def publish(self, event: CommentEvent) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, team_id: PyObjectId, endpoint_id: str) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription) -> None:
+        ...
+
+
+class InMemoryCommentBroker(CommentBroker):
+    """
+    Broker for a single process, only sees writes made by this worker.
+    """
+
+    def __init__(self, queue_size: int):
+        super().__init__(queue_size)
+        self._subscriptions: defaultdict[
+            PyObjectId, defaultdict[str, set[Subscription]]
+        ] = defaultdict(lambda: defaultdict(set))
+
+    async def publish(self, event: CommentEvent) -> None:
+        endpoints = self._subscriptions.get(event.team_id)
+        if not endpoints:
+            return
+
+        if event.endpoint_id is None:
+            subscriptions = [sub for subs in endpoints.values() for sub in subs]
+        else:
+            subscriptions = list(endpoints.get(event.endpoint_id, ()))
+
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    def subscribe(self, team_id: PyObjectId, endpoint_id: str) -> Subscription:
+        subscription = Subscription(self, team_id, endpoint_id)
+        self._subscriptions[team_id][endpoint_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        endpoints = self._subscriptions.get(subscription.team_id)
+        if endpoints is None:
+            return
+
+        subscriptions = endpoints.get(subscription.endpoint_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del endpoints[subscription.endpoint_id]
+        if not endpoints:
+            del self._subscriptions[subscription.team_id]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "teams": len(self._subscriptions),
+            "subscriptions": sum(
+                len(subs)
+                for endpoints in self._subscriptions.values()
+                for subs in endpoints.values()
+            ),
+        }
+
+
+def _get_broker(request: Request) -> CommentBroker:
+    return request.app.state.comment_broker
+
+
+CommentEvents = Annotated[CommentBroker, Depends(_get_broker)]
@@ -1,6 +1,9 @@
+from enum import StrEnum
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
-from app.utils.models.db_model import DBModel
+from app.utils.models.db_model import AppBaseModel, DBModel
 from app.utils.models.py_object_id import PyObjectId
 from app.utils.models.types import TrimedStr
 
@@ -24,3 +27,40 @@ class CommentCollection(BaseModel):
     total: int
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class CommentBatchItem(CommentCreateForm):
+    endpoint_id: TrimedStr = Field(..., min_length=1)
+
+
+class CommentBatchForm(BaseModel):
+    comments: list[CommentBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class CommentBatchItemResult(BaseModel):
+    index: int
+    comment: Optional[Comment] = None
+    error: Optional[str] = None
+
+
+class CommentBatchResult(BaseModel):
+    results: list[CommentBatchItemResult]
+    created: int
+
+
+class CommentEventType(StrEnum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    CLEARED = "cleared"
+
+
+class CommentEvent(AppBaseModel):
+    type: CommentEventType
+    team_id: PyObjectId
+    # None when every endpoint of the team is concerned
+    endpoint_id: Optional[str] = None
+    comment: Optional[Comment] = None
+    comment_id: Optional[PyObjectId] = None
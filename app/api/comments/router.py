@@ -1,11 +1,17 @@
 from fastapi import APIRouter
+from app.api.comments.model import CommentCollection
 from app.api.comments.service import CommentService
 
 router = APIRouter(prefix="/comments", tags=["Comments"])
 
 
 router.post("/{team_id}/{endpoint_id}")(CommentService.create_comment)
-router.get("/{team_id}/{endpoint_id}")(CommentService.get_comments)
+router.post("/team/{team_id}/batch")(CommentService.create_comments)
+router.get("/team/{team_id}/export")(CommentService.export_comments)
+router.get("/{team_id}/{endpoint_id}", response_model=CommentCollection)(
+    CommentService.get_comments
+)
+router.get("/{team_id}/{endpoint_id}/events")(CommentService.comment_events)
 router.put("/{comment_id}")(CommentService.update_comment)
 router.delete("/{comment_id}")(CommentService.delete_comment_by_id)
 router.delete("/team/{team_id}")(CommentService.delete_comments_by_team)
@@ -1,91 +1,404 @@
+import asyncio
+from collections import Counter
 from datetime import datetime, timezone
+from typing import Annotated, AsyncIterator, Optional
+
+from bson import ObjectId
+from fastapi import Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
 
 from app.api.comments.dependencies import MyComment
+from app.api.comments.events import CommentEvents
 from app.api.comments.model import (
-    CommentCollection,
+    CommentBatchForm,
+    CommentBatchItemResult,
+    CommentBatchResult,
     CommentCreateForm,
     Comment,
+    CommentEvent,
+    CommentEventType,
     CommentUpdateForm,
 )
-from app.api.team_members.dependencies import CurrentTeamAdmin, CurrentTeamMember
+from app.api.team_members.dependencies import (
+    CurrentTeamAdmin,
+    CurrentTeamMember,
+    get_membership,
+)
+from app.config import settings
 from app.database import Database
+from app.exceptions import InvalidParameterException
+from app.monitoring.diagnostics import db_budget
+from app.utils.cursor import decode_cursor, encode_cursor, keyset_filter
 from app.utils.models.py_object_id import PyObjectId
-from app.utils.models.types import Pagination, TrimedStr
+from app.utils.models.types import Fields, Pagination, TrimedStr
+from app.utils.response_cache import (
+    cache_key,
+    endpoint_tag,
+    response_cache,
+    team_tag,
+)
+from app.utils.responses import (
+    etag_matches,
+    json_bytes,
+    json_response,
+    not_modified,
+    validator_headers,
+)
+from app.utils.soft_delete import LIVE_ONLY, live, purge_index, soft_delete
+
+
+# Chat list order, `_id` breaks ties between comments created in the same ms
+COMMENT_SORT = [("time_created", 1), ("_id", 1)]
+COMMENT_CURSOR = [datetime, ObjectId]
+
+# Documents fetched per round trip by the streaming export
+EXPORT_BATCH_SIZE = 1000
 
 
 class CommentService:
     @staticmethod
-    async def create_indexes(db: Database) -> None:
-        # For chat list (excluding deleted comments)
-        await db.comments.create_index(
-            [
-                ("team_id", 1),
-                ("endpoint_id", 1),
-                ("time_created", -1),
+    def indexes() -> dict[str, list[IndexModel]]:
+        return {
+            "comments": [
+                # For chat list (excluding deleted comments)
+                IndexModel(
+                    [
+                        ("team_id", 1),
+                        ("endpoint_id", 1),
+                        ("time_created", -1),
+                        ("_id", -1),
+                    ],
+                    name="live_chat_list",
+                    **LIVE_ONLY,
+                ),
+                # Get comments by author (excluding deleted)
+                IndexModel("author_id", name="live_author", **LIVE_ONLY),
+                # Comments edited since, for incremental exports
+                IndexModel(
+                    [("team_id", 1), ("time_updated", 1)],
+                    name="live_team_updates",
+                    **LIVE_ONLY,
+                ),
+                purge_index(),
             ],
-            # partialFilterExpression={
-            #     "$or": [{"deleted": {"$exists": False}}, {"deleted": False}]
-            # },
-        )
-
-        # Get comments by author (excluding deleted)
-        await db.comments.create_index([("author_id", 1), ("deleted", 1)])
-
-        # For cleanup jobs - find old deleted comments
-        await db.comments.create_index(
-            "deleted",
-            expireAfterSeconds=7776000,  # 90 days - automatically remove old deleted comments
-        )
+            # Live comment count and write version per endpoint, read by get_comments
+            "comment_counters": [
+                IndexModel([("team_id", 1), ("endpoint_id", 1)], unique=True)
+            ],
+        }
 
     @staticmethod
+    @db_budget(3)
     async def create_comment(
         team_id: PyObjectId,
         endpoint_id: TrimedStr,
         form: CommentCreateForm,
         author: CurrentTeamMember,
         db: Database,
+        events: CommentEvents,
     ) -> Comment:
         data = form.model_dump()
         comment = Comment(
             author_id=author.member_id, team_id=team_id, endpoint_id=endpoint_id, **data
         )
         await db.comments.insert_one(comment.mongo_dump())
+        await _inc_counter(db, team_id, endpoint_id, 1)
+        await events.publish(
+            CommentEvent(
+                type=CommentEventType.CREATED,
+                team_id=team_id,
+                endpoint_id=endpoint_id,
+                comment=comment,
+            )
+        )
         return comment
 
     @staticmethod
+    @db_budget(3)
+    async def create_comments(
+        team_id: PyObjectId,
+        form: CommentBatchForm,
+        author: CurrentTeamMember,
+        db: Database,
+        events: CommentEvents,
+    ) -> CommentBatchResult:
+        comments = [
+            Comment(author_id=author.member_id, team_id=team_id, **item.model_dump())
+            for item in form.comments
+        ]
+
+        failed: set[int] = set()
+        try:
+            await db.comments.insert_many(
+                [comment.mongo_dump() for comment in comments], ordered=False
+            )
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details["writeErrors"]}
+
+        results = [
+            (
+                CommentBatchItemResult(index=i, error="Comment could not be saved")
+                if i in failed
+                else CommentBatchItemResult(index=i, comment=comment)
+            )
+            for i, comment in enumerate(comments)
+        ]
+        created = Counter(
+            comment.endpoint_id for i, comment in enumerate(comments) if i not in failed
+        )
+        if created:
+            await db.comment_counters.bulk_write(
+                [
+                    UpdateOne(
+                        {"team_id": team_id, "endpoint_id": endpoint_id},
+                        {"$inc": {"count": count, "version": 1}},
+                        upsert=True,
+                    )
+                    for endpoint_id, count in created.items()
+                ],
+                ordered=False,
+            )
+            response_cache.invalidate(
+                *(endpoint_tag(team_id, endpoint_id) for endpoint_id in created)
+            )
+
+        for result in results:
+            if result.comment:
+                await events.publish(
+                    CommentEvent(
+                        type=CommentEventType.CREATED,
+                        team_id=team_id,
+                        endpoint_id=result.comment.endpoint_id,
+                        comment=result.comment,
+                    )
+                )
+
+        return CommentBatchResult(results=results, created=created.total())
+
+    @staticmethod
+    # One more for the count of an endpoint without a counter yet
+    @db_budget(4)
     async def get_comments(
         team_id: PyObjectId,
         endpoint_id: str,
+        request: Request,
         db: Database,
         pagination: Pagination,
         require_member: CurrentTeamMember,
-    ) -> CommentCollection:
-        # not all the comment has deleted field
-        filter = {
-            "team_id": team_id,
-            "endpoint_id": endpoint_id,
-            "deleted": {"$ne": True},  # not equal to True
-        }
+        fields: Fields = None,
+    ) -> Response:
+        key = cache_key(request)
+        if cached := response_cache.respond(request, key):
+            return cached
+        generation = response_cache.generation()
+
+        filter = live({"team_id": team_id, "endpoint_id": endpoint_id})
+
+        if pagination.after and pagination.before:
+            raise InvalidParameterException(
+                {"before": ["Cannot be combined with after"]}
+            )
+
+        page_filter = filter
+        skip = pagination.skip
+        reverse = pagination.before is not None
+        if pagination.after or pagination.before:
+            # Keyset mode: resume the index range directly instead of skipping
+            param = "before" if reverse else "after"
+            values = decode_cursor(getattr(pagination, param), COMMENT_CURSOR, param)
+            page_filter = {**filter, **keyset_filter(COMMENT_SORT, values, reverse)}
+            skip = 0
+
+        selected = Comment.select_fields(fields)
+        projection = Comment.projection(selected)
+        if projection is not None:
+            # Sort key for the cursors, left out of the response
+            projection["time_created"] = 1
+
+        # Every write to the endpoint bumps its version, an unchanged version
+        # means the page is unchanged and needs no query
+        counter = await db.comment_counters.find_one(
+            {"team_id": team_id, "endpoint_id": endpoint_id},
+            {"count": 1, "version": 1},
+        )
+        etag = None
+        if counter:
+            total = max(counter["count"], 0)
+            etag = f'W/"{counter.get("version", 0)}"'
+            if etag_matches(request, etag):
+                return not_modified(etag)
+        else:
+            # Comments from before the counters, until 0002_rebuild_comment_counters
+            # builds theirs. No version to validate against either
+            total = await db.comments.count_documents(filter)
 
+        direction = -1 if reverse else 1
         cursor = (
-            db.comments.find(filter)
-            .sort("time_created", 1)
-            .skip(pagination.skip)
-            .limit(pagination.limit)
+            db.comments.find(page_filter, projection)
+            .sort([(field, order * direction) for field, order in COMMENT_SORT])
+            .skip(skip)
+            .limit(pagination.limit + 1)
         )
+        docs = await cursor.to_list(pagination.limit + 1)
+        has_more = len(docs) > pagination.limit
+        docs = docs[: pagination.limit]
+        if reverse:
+            docs.reverse()
+
+        # A before page always has newer items, an after/skip page older ones
+        has_next = reverse or has_more
+        has_prev = has_more if reverse else bool(pagination.after or skip)
+        next_cursor = prev_cursor = None
+        if docs and has_next:
+            next_cursor = encode_cursor(_comment_key(docs[-1]))
+        if docs and has_prev:
+            prev_cursor = encode_cursor(_comment_key(docs[0]))
+
+        # Served as CommentCollection, see the route's response_model
+        response = json_response(
+            {
+                "comments": [Comment.dump_trusted(doc, selected) for doc in docs],
+                "total": total,
+                "skip": skip,
+                "limit": pagination.limit,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+            },
+            headers=validator_headers(etag) if etag else None,
+        )
+        response_cache.store(
+            key,
+            response,
+            [team_tag(team_id), endpoint_tag(team_id, endpoint_id)],
+            generation,
+        )
+        return response
+
+    @staticmethod
+    async def export_comments(
+        team_id: PyObjectId,
+        db: Database,
+        require_member: CurrentTeamMember,
+        since: Annotated[
+            Optional[datetime],
+            Query(
+                description="Only comments created, updated or deleted after "
+                'this time, deleted ones as {"id", "deleted": true}'
+            ),
+        ] = None,
+    ) -> StreamingResponse:
+        """
+        Stream the team's live comments as NDJSON. With `since`, only what
+        changed after it: the created and updated comments, then a tombstone
+        per deleted one, so an incremental backup can drop them too.
+        """
+        order = [("endpoint_id", -1), *COMMENT_SORT]
+        if not since:
+            # Walks the chat list index backwards, so nothing is sorted in memory
+            queries = [
+                (db.comments.find(live({"team_id": team_id})).sort(order), False)
+            ]
+        else:
+            # One indexed query per kind of change, an $or of them couldn't
+            # use the chat list index. Every endpoint with comments has a counter
+            counters = db.comment_counters.find(
+                {"team_id": team_id}, {"endpoint_id": 1}
+            )
+            endpoints = [doc["endpoint_id"] async for doc in counters]
+            created = live(
+                {
+                    "team_id": team_id,
+                    "endpoint_id": {"$in": endpoints},
+                    "time_created": {"$gt": since},
+                }
+            )
+            updated = live(
+                {
+                    "team_id": team_id,
+                    "time_updated": {"$gt": since},
+                    "time_created": {"$lte": since},
+                }
+            )
+            deleted = {
+                "team_id": team_id,
+                "deleted": True,
+                "time_deleted": {"$gt": since},
+            }
+            queries = [
+                (db.comments.find(created).sort(order), False),
+                (db.comments.find(updated).sort(order), False),
+                (db.comments.find(deleted, {"_id": 1}), True),
+            ]
+
+        async def lines() -> AsyncIterator[bytes]:
+            for cursor, tombstones in queries:
+                cursor.batch_size(EXPORT_BATCH_SIZE)
+                try:
+                    async for doc in cursor:
+                        if tombstones:
+                            yield json_bytes(
+                                {"id": doc["_id"], "deleted": True}
+                            ) + b"\n"
+                        else:
+                            yield json_bytes(Comment.dump_trusted(doc)) + b"\n"
+                finally:
+                    await cursor.close()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @staticmethod
+    async def comment_events(
+        team_id: PyObjectId,
+        endpoint_id: str,
+        request: Request,
+        db: Database,
+        events: CommentEvents,
+        require_member: CurrentTeamMember,
+    ) -> StreamingResponse:
+        """
+        Server-Sent Events feed of the comment writes on an endpoint.
+        """
 
-        total = await db.comments.count_documents(filter)
+        async def stream() -> AsyncIterator[bytes]:
+            with events.subscribe(team_id, endpoint_id) as subscription:
+                yield b"retry: 3000\n\n"
+                while True:
+                    try:
+                        event = await asyncio.wait_for(
+                            subscription.get(), settings.COMMENT_FEED_HEARTBEAT_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        # Stop feeding clients that left or lost their membership
+                        if await request.is_disconnected() or not await get_membership(
+                            team_id, require_member.member_id, db
+                        ):
+                            return
+                        yield b": heartbeat\n\n"
+                        continue
 
-        return CommentCollection(
-            comments=await cursor.to_list(pagination.limit),
-            total=total,
-            limit=pagination.limit,
-            skip=pagination.skip,
+                    if event is None:
+                        # Fell behind, the client has to reload and reconnect
+                        yield b"event: overflow\ndata: {}\n\n"
+                        return
+
+                    data = event.model_dump_json(by_alias=True)
+                    yield f"event: {event.type}\ndata: {data}\n\n".encode()
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
     @staticmethod
+    @db_budget(4)
     async def update_comment(
-        comment: MyComment, form: CommentUpdateForm, db: Database
+        comment: MyComment,
+        form: CommentUpdateForm,
+        db: Database,
+        events: CommentEvents,
     ) -> Comment:
         data = form.model_dump(exclude_unset=True)
         data["time_updated"] = datetime.now(timezone.utc)
@@ -95,54 +408,147 @@ class CommentService:
         )
         if result.modified_count == 0:
             return comment
+        await _inc_counter(db, comment.team_id, comment.endpoint_id, 0)
         comment_data = comment.mongo_dump()
         comment_data.update(data)
-        return Comment.model_construct(**comment_data)
+        updated = Comment.model_construct(**comment_data)
+        await events.publish(
+            CommentEvent(
+                type=CommentEventType.UPDATED,
+                team_id=comment.team_id,
+                endpoint_id=comment.endpoint_id,
+                comment=updated,
+            )
+        )
+        return updated
 
     @staticmethod
-    async def delete_comment_by_id(comment: MyComment, db: Database) -> None:
-        await db.comments.update_one(
-            {"_id": comment.id},
-            {
-                "$set": {
-                    "deleted": True,
-                    "time_deleted": datetime.now(timezone.utc),
-                    "deleted_by": comment.author_id,
-                }
-            },
+    async def delete_comment_by_id(
+        comment: MyComment, db: Database, events: CommentEvents
+    ) -> None:
+        result = await db.comments.update_one(
+            live({"_id": comment.id}), soft_delete(comment.author_id)
         )
+        if result.modified_count:
+            await _inc_counter(db, comment.team_id, comment.endpoint_id, -1)
+            await events.publish(
+                CommentEvent(
+                    type=CommentEventType.DELETED,
+                    team_id=comment.team_id,
+                    endpoint_id=comment.endpoint_id,
+                    comment_id=comment.id,
+                )
+            )
 
     @staticmethod
     async def delete_comments_by_endpoint(
         team_id: PyObjectId,
         endpoint_id: str,
         db: Database,
+        events: CommentEvents,
         require_admin: CurrentTeamAdmin,
     ) -> int:
         result = await db.comments.update_many(
-            {"team_id": team_id, "endpoint_id": endpoint_id, "deleted": False},
-            {
-                "$set": {
-                    "deleted": True,
-                    "time_deleted": datetime.now(timezone.utc),
-                    "deleted_by": require_admin.member_id,
-                }
-            },
+            live({"team_id": team_id, "endpoint_id": endpoint_id}),
+            soft_delete(require_admin.member_id),
         )
+        if result.modified_count:
+            await _inc_counter(db, team_id, endpoint_id, -result.modified_count)
+            await events.publish(
+                CommentEvent(
+                    type=CommentEventType.CLEARED,
+                    team_id=team_id,
+                    endpoint_id=endpoint_id,
+                )
+            )
         return result.modified_count
 
     @staticmethod
     async def delete_comments_by_team(
-        team_id: PyObjectId, db: Database, require_admin: CurrentTeamAdmin
+        team_id: PyObjectId,
+        db: Database,
+        events: CommentEvents,
+        require_admin: CurrentTeamAdmin,
     ) -> int:
         result = await db.comments.update_many(
-            {"team_id": team_id, "deleted": False},
+            live({"team_id": team_id}), soft_delete(require_admin.member_id)
+        )
+        # Every live comment of the team is gone, whatever endpoint it was on
+        await db.comment_counters.update_many(
+            {"team_id": team_id}, {"$set": {"count": 0}, "$inc": {"version": 1}}
+        )
+        response_cache.invalidate(team_tag(team_id))
+        if result.modified_count:
+            await events.publish(
+                CommentEvent(type=CommentEventType.CLEARED, team_id=team_id)
+            )
+        return result.modified_count
+
+    @staticmethod
+    async def rebuild_counters(db: Database) -> int:
+        """
+        Recompute every endpoint counter from the comments collection.
+        """
+
+        time_rebuilt = datetime.now(timezone.utc)
+        cursor = await db.comments.aggregate(
+            [
+                {"$match": live({})},
+                {
+                    "$group": {
+                        "_id": {"team_id": "$team_id", "endpoint_id": "$endpoint_id"},
+                        "count": {"$sum": 1},
+                    }
+                },
+            ]
+        )
+
+        rebuilt = 0
+        requests = []
+        async for doc in cursor:
+            requests.append(
+                UpdateOne(
+                    doc["_id"],
+                    {
+                        "$set": {"count": doc["count"], "time_updated": time_rebuilt},
+                        "$inc": {"version": 1},
+                    },
+                    upsert=True,
+                )
+            )
+            if len(requests) == 1000:
+                rebuilt += len(requests)
+                await db.comment_counters.bulk_write(requests, ordered=False)
+                requests = []
+        if requests:
+            rebuilt += len(requests)
+            await db.comment_counters.bulk_write(requests, ordered=False)
+
+        # Endpoints left without live comments
+        await db.comment_counters.update_many(
+            {"time_updated": {"$ne": time_rebuilt}},
             {
-                "$set": {
-                    "deleted": True,
-                    "time_deleted": datetime.now(timezone.utc),
-                    "deleted_by": require_admin.member_id,
-                }
+                "$set": {"count": 0, "time_updated": time_rebuilt},
+                "$inc": {"version": 1},
             },
         )
-        return result.modified_count
+        return rebuilt
+
+
+async def _inc_counter(
+    db: Database, team_id: PyObjectId, endpoint_id: str, amount: int
+) -> None:
+    """
+    Adjust the live comment count of an endpoint, bump its version and drop its
+    cached pages.
+    """
+    await db.comment_counters.update_one(
+        {"team_id": team_id, "endpoint_id": endpoint_id},
+        {"$inc": {"count": amount, "version": 1}},
+        upsert=True,
+    )
+    response_cache.invalidate(endpoint_tag(team_id, endpoint_id))
+
+
+def _comment_key(doc: dict) -> list:
+    return [doc[field] for field, _ in COMMENT_SORT]
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+
+from app.api.health.service import HealthService
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+router.get("/live")(HealthService.live)
+router.get("/ready")(HealthService.ready)
+router.get("/pool")(HealthService.pool_stats)
@@ -0,0 +1,37 @@
+import asyncio
+
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError
+
+from app.database import Database
+from app.monitoring.pool import pool_monitor
+
+# Longest a readiness probe waits for the database
+READY_TIMEOUT_SECONDS = 2
+
+
+class HealthService:
+    @staticmethod
+    async def live() -> dict:
+        """
+        The process is up and serving requests.
+        """
+        return {"status": "ok"}
+
+    @staticmethod
+    async def ready(db: Database) -> dict:
+        """
+        The database answers, so the instance can take traffic.
+        """
+        try:
+            await asyncio.wait_for(db.command("ping"), READY_TIMEOUT_SECONDS)
+        except (PyMongoError, asyncio.TimeoutError):
+            raise HTTPException(503, "Database unavailable")
+        return {"status": "ok"}
+
+    @staticmethod
+    async def pool_stats() -> dict:
+        """
+        Connection pool usage per MongoDB server.
+        """
+        return {"pools": pool_monitor.stats()}
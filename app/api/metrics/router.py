@@ -0,0 +1,7 @@
+from fastapi import APIRouter
+
+from app.api.metrics.service import MetricsService
+
+router = APIRouter(tags=["Health"])
+
+router.get("/metrics", include_in_schema=False)(MetricsService.metrics)
@@ -0,0 +1,35 @@
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+
+from app.api.team_members.dependencies import membership_cache
+from app.api.users.password_hash import hash_pool
+from app.api.users.service import user_cache
+from app.api.users.token import token_cache
+from app.monitoring.metrics import component_stats, registry
+from app.monitoring.pool import pool_monitor
+from app.utils.response_cache import response_cache
+
+
+class MetricsService:
+    @staticmethod
+    async def metrics(request: Request) -> PlainTextResponse:
+        """
+        Prometheus text exposition of the request, MongoDB and component metrics.
+        """
+        components = {
+            "token_cache": token_cache.stats(),
+            "user_cache": user_cache.stats(),
+            "membership_cache": membership_cache.stats(),
+            "response_cache": response_cache.stats(),
+            "password_hash_pool": hash_pool.stats(),
+            "comment_broker": request.app.state.comment_broker.stats(),
+        }
+        for address, stats in pool_monitor.stats().items():
+            components[f"mongo_pool:{address}"] = stats
+        for component, stats in components.items():
+            for stat, value in stats.items():
+                component_stats.set(component, stat, value=value)
+
+        return PlainTextResponse(
+            registry.expose(), media_type="text/plain; version=0.0.4"
+        )
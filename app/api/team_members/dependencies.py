@@ -1,47 +1,139 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
 
 from app.api.team_members.model import TeamMemberInDB, TeamMemberRole
-from app.api.users.dependency import CurrentUser
+from app.api.users.service import (
+    UserService,
+    cache_user,
+    credentials_exception,
+    http_bearer,
+    user_cache,
+)
+from app.config import settings
 from app.database import Database
+from app.utils.cache import MISSING, TTLCache
 from app.utils.models.py_object_id import PyObjectId
+from app.utils.soft_delete import live
+
+# (team_id, member_id) -> membership, None when the user is not in the team
+membership_cache: TTLCache[
+    tuple[PyObjectId, PyObjectId], Optional[TeamMemberInDB]
+] = TTLCache(settings.MEMBERSHIP_CACHE_SIZE, settings.MEMBERSHIP_CACHE_TTL_SECONDS)
+
+
+def invalidate_membership(
+    team_id: PyObjectId, member_id: Optional[PyObjectId] = None
+) -> None:
+    """
+    Forget a cached membership, or every membership of the team.
+    """
+    if member_id is None:
+        membership_cache.invalidate_if(lambda key: key[0] == team_id)
+    else:
+        membership_cache.pop((team_id, member_id))
+
+
+def _cache_membership(
+    team_id: PyObjectId, member_id: PyObjectId, member_doc: Optional[dict]
+) -> Optional[TeamMemberInDB]:
+    key = (team_id, member_id)
+    if not member_doc:
+        membership_cache.set(key, None, settings.MEMBERSHIP_NEGATIVE_TTL_SECONDS)
+        return None
+
+    # Trusted document, only the role needs converting for comparisons
+    member_doc["role"] = TeamMemberRole(member_doc["role"])
+    member = TeamMemberInDB.model_construct(**member_doc)
+    membership_cache.set(key, member)
+    return member
+
+
+async def get_membership(
+    team_id: PyObjectId, member_id: PyObjectId, db: Database
+) -> Optional[TeamMemberInDB]:
+    member = membership_cache.get((team_id, member_id))
+    if member is not MISSING:
+        return member
+
+    member_doc = await db.team_members.find_one(
+        live({"team_id": team_id, "member_id": member_id})
+    )
+    return _cache_membership(team_id, member_id, member_doc)
+
+
+async def _load_user_and_membership(
+    team_id: PyObjectId, user_id: PyObjectId, db: Database
+) -> Optional[TeamMemberInDB]:
+    """
+    Resolve the user and their membership of the team in one round trip.
+    """
+
+    cursor = await db.users.aggregate(
+        [
+            {"$match": {"_id": user_id}},
+            {
+                "$lookup": {
+                    "from": "team_members",
+                    "localField": "_id",
+                    "foreignField": "member_id",
+                    "pipeline": [
+                        {"$match": live({"team_id": team_id})},
+                        {"$limit": 1},
+                    ],
+                    "as": "membership",
+                }
+            },
+        ]
+    )
+    docs = await cursor.to_list(1)
+    if not docs:
+        raise credentials_exception()
+
+    memberships = docs[0].pop("membership")
+    cache_user(user_id, docs[0])
+    return _cache_membership(team_id, user_id, memberships[0] if memberships else None)
 
 
 async def _require_team_role(
     team_id: PyObjectId,
-    current_user: CurrentUser,
+    authorization: Optional[HTTPAuthorizationCredentials],
     min_role: TeamMemberRole,
     db: Database,
 ) -> TeamMemberInDB:
-    member_doc = await db.team_members.find_one(
-        {"team_id": team_id, "member_id": current_user.id, "deleted": {"$ne": True}}
-    )
+    user_id = UserService.authenticate(authorization)
+
+    if user_cache.get(str(user_id)) is MISSING:
+        member = await _load_user_and_membership(team_id, user_id, db)
+    else:
+        member = await get_membership(team_id, user_id, db)
 
-    if member_doc:
-        member = TeamMemberInDB(**member_doc)
-        if member.role >= min_role:
-            return member
+    if member and member.role >= min_role:
+        return member
 
     raise HTTPException(status_code=403, detail=f"Action requires {min_role} role")
 
 
+Authorization = Annotated[HTTPAuthorizationCredentials, Depends(http_bearer)]
+
+
 async def _require_team_creator(
-    team_id: PyObjectId, current_user: CurrentUser, db: Database
+    team_id: PyObjectId, authorization: Authorization, db: Database
 ):
-    return await _require_team_role(team_id, current_user, TeamMemberRole.CREATOR, db)
+    return await _require_team_role(team_id, authorization, TeamMemberRole.CREATOR, db)
 
 
 async def _require_team_member(
-    team_id: PyObjectId, current_user: CurrentUser, db: Database
+    team_id: PyObjectId, authorization: Authorization, db: Database
 ):
-    return await _require_team_role(team_id, current_user, TeamMemberRole.MEMBER, db)
+    return await _require_team_role(team_id, authorization, TeamMemberRole.MEMBER, db)
 
 
 async def _require_team_admin(
-    team_id: PyObjectId, current_user: CurrentUser, db: Database
+    team_id: PyObjectId, authorization: Authorization, db: Database
 ):
-    return await _require_team_role(team_id, current_user, TeamMemberRole.ADMIN, db)
+    return await _require_team_role(team_id, authorization, TeamMemberRole.ADMIN, db)
 
 
 CurrentTeamCreator = Annotated[TeamMemberInDB, Depends(_require_team_creator)]
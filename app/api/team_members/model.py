@@ -1,8 +1,11 @@
-from pydantic import BaseModel
+from enum import StrEnum
+from typing import Optional
+
+from pydantic import BaseModel, Field
 
 from app.utils.models.db_model import AppBaseModel, DBModel
 from app.utils.models.py_object_id import PyObjectId
-from app.utils.models.types import OrderedStrEnum
+from app.utils.models.types import Email, OrderedStrEnum
 
 
 class TeamMemberRole(OrderedStrEnum):
@@ -35,3 +38,24 @@ class TeamMember(AppBaseModel):
 
 class TeamMemberCollection(BaseModel):
     members: list[TeamMember]
+    next_cursor: Optional[str] = None
+
+
+class TeamMemberBatchForm(BaseModel):
+    emails: list[Email] = Field(..., min_length=1, max_length=500)
+
+
+class TeamMemberBatchStatus(StrEnum):
+    ADDED = "added"
+    ALREADY_MEMBER = "already_member"
+    UNKNOWN_EMAIL = "unknown_email"
+
+
+class TeamMemberBatchItemResult(AppBaseModel):
+    email: str
+    status: TeamMemberBatchStatus
+    member_id: Optional[PyObjectId] = None
+
+
+class TeamMemberBatchResult(BaseModel):
+    results: list[TeamMemberBatchItemResult]
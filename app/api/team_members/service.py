@@ -1,31 +1,77 @@
-from datetime import datetime, timezone
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import Body, HTTPException
-from pymongo import ReturnDocument
-from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from fastapi import Body, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-from app.api.team_members.dependencies import CurrentTeamMember, CurrentTeamAdmin
+from app.api.team_members.dependencies import (
+    CurrentTeamMember,
+    CurrentTeamAdmin,
+    invalidate_membership,
+)
 from app.api.team_members.model import (
-    TeamMemberCollection,
+    TeamMemberBatchForm,
+    TeamMemberBatchItemResult,
+    TeamMemberBatchResult,
+    TeamMemberBatchStatus,
+    TeamMember,
     TeamMemberInDB,
     TeamMemberRole,
     TeamMemberUpdateForm,
 )
 from app.api.users.service import UserService
 from app.database import Database
+from app.monitoring.diagnostics import db_budget
 from app.utils.models.py_object_id import PyObjectId
-from app.utils.models.types import Email
+from app.utils.cursor import decode_cursor, encode_cursor, keyset_filter
+from app.utils.models.types import CursorPagination, Email
+from app.utils.response_cache import (
+    cache_key,
+    response_cache,
+    team_tag,
+    user_tag,
+)
+from app.utils.responses import (
+    etag_matches,
+    json_bytes,
+    json_response,
+    not_modified,
+    validator_headers,
+)
+from app.utils.soft_delete import LIVE_ONLY, live, purge_index, soft_delete
+
+# Roster order, served by the unique (team_id, member_id) index
+ROSTER_SORT = [("member_id", 1)]
+ROSTER_CURSOR = [ObjectId]
+
+# Documents fetched per round trip when streaming the roster
+ROSTER_BATCH_SIZE = 1000
 
 
 class TeamMemberService:
     @staticmethod
-    async def create_indexes(db: Database):
-        await db.team_members.create_index(
-            [("team_id", 1), ("member_id", 1)], unique=True
-        )
-        await db.team_members.create_index("member_id")
-        await db.team_members.create_index("team_id")
+    def indexes() -> dict[str, list[IndexModel]]:
+        return {
+            "team_members": [
+                # Unique among live rows only, so a removed member can be added back
+                IndexModel(
+                    [("team_id", 1), ("member_id", 1)],
+                    name="live_team_member",
+                    unique=True,
+                    **LIVE_ONLY,
+                ),
+                # my_teams pages memberships in join order
+                IndexModel(
+                    [("member_id", 1), ("time_created", 1), ("_id", 1)],
+                    name="live_member_teams",
+                    **LIVE_ONLY,
+                ),
+                IndexModel("team_id"),
+                purge_index(),
+            ]
+        }
 
     @staticmethod
     async def add_team_member(
@@ -35,7 +81,6 @@ class TeamMemberService:
         # Require admin action
         current_admin: CurrentTeamAdmin,
     ) -> TeamMemberInDB:
-
         member = await UserService.get_user_by_email(member_email, db)
 
         team_member = TeamMemberInDB(
@@ -49,27 +94,116 @@ class TeamMemberService:
                 status_code=400, detail="User is already a member of this team"
             )
 
+        await _bump_members_version(db, team_id)
+        invalidate_membership(team_id, member.id)
+        response_cache.invalidate(user_tag(member.id))
         return team_member
 
+    @staticmethod
+    @db_budget(5)
+    async def add_team_members(
+        team_id: PyObjectId,
+        form: TeamMemberBatchForm,
+        db: Database,
+        # Require admin action
+        current_admin: CurrentTeamAdmin,
+    ) -> TeamMemberBatchResult:
+        emails = list(dict.fromkeys(form.emails))
+
+        users = db.users.find({"email": {"$in": emails}}, {"email": 1})
+        user_ids = {doc["email"]: doc["_id"] async for doc in users}
+
+        team_members = [
+            TeamMemberInDB(
+                role=TeamMemberRole.MEMBER, team_id=team_id, member_id=user_ids[email]
+            )
+            for email in emails
+            if email in user_ids
+        ]
+
+        duplicates: set[int] = set()
+        if team_members:
+            try:
+                await db.team_members.insert_many(
+                    [member.mongo_dump() for member in team_members], ordered=False
+                )
+            except BulkWriteError as e:
+                errors = e.details["writeErrors"]
+                if any(error["code"] != 11000 for error in errors):
+                    raise
+                duplicates = {error["index"] for error in errors}
+
+        if len(duplicates) < len(team_members):
+            await _bump_members_version(db, team_id)
+
+        statuses = {}
+        for i, member in enumerate(team_members):
+            if i in duplicates:
+                statuses[member.member_id] = TeamMemberBatchStatus.ALREADY_MEMBER
+            else:
+                statuses[member.member_id] = TeamMemberBatchStatus.ADDED
+                invalidate_membership(team_id, member.member_id)
+                response_cache.invalidate(user_tag(member.member_id))
+
+        results = []
+        for email in emails:
+            if member_id := user_ids.get(email):
+                result = TeamMemberBatchItemResult(
+                    email=email, status=statuses[member_id], member_id=member_id
+                )
+            else:
+                result = TeamMemberBatchItemResult(
+                    email=email, status=TeamMemberBatchStatus.UNKNOWN_EMAIL
+                )
+            results.append(result)
+
+        return TeamMemberBatchResult(results=results)
+
     @staticmethod
     async def get_team_members(
         team_id: PyObjectId,
+        request: Request,
         db: Database,
+        pagination: CursorPagination,
         # Authorization: must be at least MEMBER
         current_meber: CurrentTeamMember,
-    ) -> TeamMemberCollection:
+        stream: Annotated[
+            bool, Query(description="Stream the whole roster as NDJSON instead")
+        ] = False,
+    ) -> Response:
+        key = cache_key(request)
+        if not stream and (cached := response_cache.respond(request, key)):
+            return cached
+        generation = response_cache.generation()
+
+        match = live({"team_id": team_id})
+        if pagination.after:
+            values = decode_cursor(pagination.after, ROSTER_CURSOR, "after")
+            match.update(keyset_filter(ROSTER_SORT, values))
+
+        team = await db.teams.find_one({"_id": team_id}, {"members_version": 1})
+        etag = f'W/"{team.get("members_version", 0) if team else 0}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
         pipeline = [
-            {"$match": {"team_id": team_id}},
+            # Walks the unique (team_id, member_id) index
+            {"$match": match},
+            {"$sort": dict(ROSTER_SORT)},
             {
                 "$lookup": {
                     "from": "users",
                     "localField": "member_id",
                     "foreignField": "_id",
+                    "pipeline": [{"$project": {"_id": 0, "name": 1, "email": 1}}],
                     "as": "user",
                 }
             },
             {"$unwind": "$user"},
+        ]
+        if not stream:
+            pipeline.append({"$limit": pagination.limit + 1})
+        pipeline.append(
             {
                 "$project": {
                     "_id": 0,
@@ -78,12 +212,45 @@ class TeamMemberService:
                     "name": "$user.name",
                     "email": "$user.email",  # optional
                 }
-            },
-        ]
+            }
+        )
+
+        if stream:
+            cursor = await db.team_members.aggregate(
+                pipeline, batchSize=ROSTER_BATCH_SIZE
+            )
+
+            async def lines() -> AsyncIterator[bytes]:
+                try:
+                    async for doc in cursor:
+                        yield json_bytes(TeamMember.dump_trusted(doc)) + b"\n"
+                finally:
+                    await cursor.close()
+
+            return StreamingResponse(
+                lines(),
+                media_type="application/x-ndjson",
+                headers=validator_headers(etag),
+            )
 
         cursor = await db.team_members.aggregate(pipeline)
-        team_members = TeamMemberCollection(members=await cursor.to_list(1000))
-        return team_members
+        docs = await cursor.to_list(pagination.limit + 1)
+
+        next_cursor = None
+        if len(docs) > pagination.limit:
+            docs = docs[: pagination.limit]
+            next_cursor = encode_cursor([docs[-1][field] for field, _ in ROSTER_SORT])
+
+        # Served as TeamMemberCollection, see the route's response_model
+        response = json_response(
+            {
+                "members": [TeamMember.dump_trusted(doc) for doc in docs],
+                "next_cursor": next_cursor,
+            },
+            headers=validator_headers(etag),
+        )
+        response_cache.store(key, response, [team_tag(team_id)], generation)
+        return response
 
     @staticmethod
     async def update_member_role(
@@ -95,7 +262,7 @@ class TeamMemberService:
         current_admin: CurrentTeamAdmin,
     ) -> TeamMemberInDB:
         member_doc = await db.team_members.find_one(
-            {"team_id": team_id, "member_id": member_id, "deleted": {"$ne": True}}
+            live({"team_id": team_id, "member_id": member_id})
         )
 
         if member_doc:
@@ -104,10 +271,13 @@ class TeamMemberService:
                 raise HTTPException(403, "Cannot change creator role")
 
             doc = await db.team_members.find_one_and_update(
-                {"_id": member.id, "deleted": {"$ne": True}},
+                live({"_id": member.id}),
                 {"$set": form.model_dump(exclude_unset=True)},
                 return_document=ReturnDocument.AFTER,
             )
+            await _bump_members_version(db, team_id)
+            invalidate_membership(team_id, member_id)
+            response_cache.invalidate(user_tag(member_id))
             if doc:
                 return TeamMemberInDB(**doc)
 
@@ -121,17 +291,22 @@ class TeamMemberService:
         # Require admin action
         current_admin: CurrentTeamAdmin,
     ) -> None:
-        filter = {"team_id": team_id, "member_id": member_id}
-        result = await db.comments.update_one(
-            filter,
-            {
-                "$set": {
-                    "deleted": True,
-                    "time_deleted": datetime.now(timezone.utc),
-                    "deleted_by": current_admin.member_id,
-                }
-            },
+        result = await db.team_members.update_one(
+            live({"team_id": team_id, "member_id": member_id}),
+            soft_delete(current_admin.member_id),
         )
+        invalidate_membership(team_id, member_id)
+        response_cache.invalidate(user_tag(member_id))
 
         if result.modified_count == 0:
             raise HTTPException(404, "Team member not found")
+        await _bump_members_version(db, team_id)
+
+
+async def _bump_members_version(db: Database, team_id: PyObjectId) -> None:
+    """
+    Invalidate the roster ETags and cached pages of the team, after any
+    membership write.
+    """
+    await db.teams.update_one({"_id": team_id}, {"$inc": {"members_version": 1}})
+    response_cache.invalidate(team_tag(team_id))
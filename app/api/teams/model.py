@@ -1,5 +1,10 @@
+from enum import StrEnum
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
+from app.api.team_members.model import TeamMemberRole
+
 from app.utils.models.db_model import DBModel
 from app.utils.models.py_object_id import PyObjectId
 from app.utils.models.types import TrimedStr
@@ -16,3 +21,17 @@ class TeamUpdateForm(TeamCreateForm):
 class Team(DBModel):
     name: str
     creator_id: PyObjectId
+
+
+class MyTeam(Team):
+    role: TeamMemberRole
+
+
+class MyTeamSort(StrEnum):
+    JOINED = "joined"
+    NAME = "name"
+
+
+class MyTeamCollection(BaseModel):
+    teams: list[MyTeam]
+    next_cursor: Optional[str] = None
@@ -1,12 +1,19 @@
-from datetime import datetime, timezone
 import re
+from datetime import datetime
 
-from fastapi import HTTPException
-from pymongo import ReturnDocument
+from bson import ObjectId
+from fastapi import HTTPException, Request, Response
+from pymongo import IndexModel, ReturnDocument
 
-from app.api.team_members.dependencies import CurrentTeamAdmin, CurrentTeamCreator
+from app.api.team_members.dependencies import (
+    CurrentTeamAdmin,
+    CurrentTeamCreator,
+    invalidate_membership,
+)
 from app.api.team_members.model import TeamMemberInDB, TeamMemberRole
 from app.api.teams.model import (
+    MyTeam,
+    MyTeamSort,
     Team,
     TeamCreateForm,
     TeamUpdateForm,
@@ -14,13 +21,39 @@ from app.api.teams.model import (
 from app.api.users.dependency import CurrentUser
 from app.database import Database
 from app.exceptions import InvalidParameterException
+from app.monitoring.diagnostics import db_budget
+from app.utils.cursor import decode_cursor, encode_cursor, keyset_filter
 from app.utils.models.py_object_id import PyObjectId
+from app.utils.models.types import CursorPagination, Fields
+from app.utils.response_cache import (
+    cache_key,
+    response_cache,
+    team_tag,
+    user_tag,
+)
+from app.utils.responses import json_response
+from app.utils.soft_delete import LIVE_ONLY, live, purge_index, soft_delete
+
+# Keyset order of my_teams, on memberships for JOINED and joined teams for NAME
+MY_TEAMS_SORTS = {
+    MyTeamSort.JOINED: [("time_created", 1), ("_id", 1)],
+    MyTeamSort.NAME: [("team.name", 1), ("team._id", 1)],
+}
+MY_TEAMS_CURSORS = {
+    MyTeamSort.JOINED: [datetime, ObjectId],
+    MyTeamSort.NAME: [str, ObjectId],
+}
 
 
 class TeamService:
     @staticmethod
-    async def create_indexes(db: Database):
-        await db.teams.create_index("creator_id")
+    def indexes() -> dict[str, list[IndexModel]]:
+        return {
+            "teams": [
+                IndexModel("creator_id", name="live_creator", **LIVE_ONLY),
+                purge_index(),
+            ]
+        }
 
     @staticmethod
     async def create_team(
@@ -30,11 +63,12 @@ class TeamService:
 
         # Check if user already create same name
         existing = await db.teams.find_one(
-            {
-                "creator_id": team.creator_id,
-                "name": {"$regex": f"^{re.escape(team.name)}$", "$options": "i"},
-                "deleted": {"$ne": True},
-            }
+            live(
+                {
+                    "creator_id": team.creator_id,
+                    "name": {"$regex": f"^{re.escape(team.name)}$", "$options": "i"},
+                }
+            )
         )
         if existing:
             raise InvalidParameterException({"name": ["Name already exist"]})
@@ -47,20 +81,89 @@ class TeamService:
         )
 
         await db.team_members.insert_one(team_member.mongo_dump())
+        response_cache.invalidate(user_tag(creator.id))
 
         return team
 
     @staticmethod
-    async def my_teams(user: CurrentUser, db: Database) -> list[Team]:
-        memberships = db.team_members.find(
-            {"member_id": user.id, "deleted": {"$ne": True}}, {"team_id": 1}
+    @db_budget(2)
+    async def my_teams(
+        user: CurrentUser,
+        request: Request,
+        db: Database,
+        pagination: CursorPagination,
+        sort: MyTeamSort = MyTeamSort.JOINED,
+        fields: Fields = None,
+    ) -> Response:
+        key = cache_key(request, user.id)
+        if cached := response_cache.respond(request, key):
+            return cached
+        generation = response_cache.generation()
+
+        key_fields = MY_TEAMS_SORTS[sort]
+        keyset = {}
+        if pagination.after:
+            values = decode_cursor(pagination.after, MY_TEAMS_CURSORS[sort], "after")
+            keyset = keyset_filter(key_fields, values)
+
+        membership_match = live({"member_id": user.id})
+        selected = MyTeam.select_fields(fields)
+        team_pipeline: list[dict] = [{"$match": live({})}]
+        if (projection := MyTeam.projection(selected)) is not None:
+            team_pipeline.append({"$project": {**projection, "name": 1}})
+        lookup = [
+            {
+                "$lookup": {
+                    "from": "teams",
+                    "localField": "team_id",
+                    "foreignField": "_id",
+                    "pipeline": team_pipeline,
+                    "as": "team",
+                }
+            },
+            {"$unwind": "$team"},
+        ]
+
+        if sort == MyTeamSort.JOINED:
+            # Walks the member_id index, teams are only joined for the page
+            pipeline = [
+                {"$match": {**membership_match, **keyset}},
+                {"$sort": dict(key_fields)},
+                *lookup,
+            ]
+        else:
+            pipeline = [{"$match": membership_match}, *lookup]
+            if keyset:
+                pipeline.append({"$match": keyset})
+            pipeline.append({"$sort": dict(key_fields)})
+        pipeline += [
+            {"$limit": pagination.limit + 1},
+            {"$project": {"role": 1, "time_created": 1, "team": 1}},
+        ]
+
+        cursor = await db.team_members.aggregate(pipeline)
+        docs = await cursor.to_list(pagination.limit + 1)
+
+        next_cursor = None
+        if len(docs) > pagination.limit:
+            docs = docs[: pagination.limit]
+            next_cursor = encode_cursor(
+                [_get_path(docs[-1], field) for field, _ in key_fields]
+            )
+
+        response = json_response(
+            {
+                "teams": [
+                    MyTeam.dump_trusted({**doc["team"], "role": doc["role"]}, selected)
+                    for doc in docs
+                ],
+                "next_cursor": next_cursor,
+            }
         )
-
-        team_ids = [doc["team_id"] async for doc in memberships]
-
-        teams = db.teams.find({"_id": {"$in": team_ids}, "deleted": {"$ne": True}})
-
-        return [Team(**doc) async for doc in teams]
+        # Tagged by team as well, so renaming a team drops its members' pages
+        tags = [user_tag(user.id), *(team_tag(doc["team"]["_id"]) for doc in docs)]
+        response_cache.store(key, response, tags, generation)
+        return response
 
     @staticmethod
     async def update_team(
@@ -70,29 +173,31 @@ class TeamService:
         require_admin: CurrentTeamAdmin,
     ) -> Team:
         result = await db.teams.find_one_and_update(
-            {"_id": team_id, "deleted": {"$ne": True}},
+            live({"_id": team_id}),
             {"$set": form.model_dump(exclude_unset=True)},
             return_document=ReturnDocument.AFTER,
         )
 
         if not result:
             raise HTTPException(404, "Team not found")
+        response_cache.invalidate(team_tag(team_id))
         return Team(**result)
 
     @staticmethod
     async def delete_team(
         team_id: PyObjectId, db: Database, reqiure_creator: CurrentTeamCreator
     ) -> None:
-        result = await db.comments.update_one(
-            {"_id": team_id},
-            {
-                "$set": {
-                    "deleted": True,
-                    "time_deleted": datetime.now(timezone.utc),
-                    "deleted_by": reqiure_creator.member_id,
-                }
-            },
+        result = await db.teams.update_one(
+            live({"_id": team_id}), soft_delete(reqiure_creator.member_id)
         )
+        invalidate_membership(team_id)
+        response_cache.invalidate(team_tag(team_id))
 
         if result.modified_count == 0:
             raise HTTPException(404, "Team not found")
+
+
+def _get_path(doc: dict, path: str):
+    for key in path.split("."):
+        doc = doc[key]
+    return doc
@@ -1,4 +1,14 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
 import bcrypt
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+T = TypeVar("T")
 
 
 def hash_password(password: str) -> str:
@@ -8,3 +18,74 @@ def hash_password(password: str) -> str:
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+class PasswordHashPool:
+    """
+    Size limited thread pool that keeps bcrypt off the event loop.
+    Requests beyond `max_queue` waiting jobs are rejected with 503.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="bcrypt")
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        submitted = time.perf_counter()
+
+        def job() -> tuple[float, T]:
+            return time.perf_counter() - submitted, fn(*args)
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            waited, result = await loop.run_in_executor(self._executor, job)
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return result
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+hash_pool = PasswordHashPool(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await hash_pool.run(verify_password, password, hashed)
@@ -7,3 +7,4 @@ router.post("/register")(UserService.register_user)
 router.post("/login")(UserService.login_user)
 router.post("/refresh")(UserService.refresh_token)
 router.post("/logout")(UserService.logout)
+router.post("/logout-all")(UserService.logout_all)
@@ -1,8 +1,10 @@
-from typing import Annotated, cast
+from datetime import datetime, timezone
+from typing import Annotated, Optional, cast
 
 from bson import ObjectId
 from fastapi import Body, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pymongo import IndexModel
 
 from app.api.users.model import (
     LoginForm,
@@ -13,28 +15,41 @@ from app.api.users.model import (
     User,
     UserWithPassword,
 )
-from app.api.users.password_hash import hash_password, verify_password
+from app.api.users.password_hash import hash_password_async, verify_password_async
 from app.api.users.token import (
     encode_access_token,
     encode_refresh_token,
     decode_token,
 )
+from app.config import settings
 from app.database import Database
 from app.exceptions import InvalidParameterException
+from app.utils.cache import MISSING, TTLCache
 from app.utils.models.py_object_id import PyObjectId
 from app.utils.models.types import Email
 
 http_bearer = HTTPBearer(auto_error=False)
 
+# Users resolved by require_user, keyed by the token subject (user id).
+# Users are never written after registration, a route that updates or
+# deletes one must pop it from here
+user_cache: TTLCache[str, User] = TTLCache(
+    settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS
+)
+
 
 class UserService:
     @staticmethod
-    async def create_indexes(db: Database):
-        await db.users.create_index("email", unique=True)
-        await db.refresh_tokens.create_index("token", unique=True)
-        await db.refresh_tokens.create_index("user_id")
-        # Automatically delete expired tokens.
-        await db.refresh_tokens.create_index("time_expires", expireAfterSeconds=0)
+    def indexes() -> dict[str, list[IndexModel]]:
+        return {
+            "users": [IndexModel("email", unique=True)],
+            "refresh_tokens": [
+                IndexModel("token", unique=True),
+                IndexModel("user_id"),
+                # Automatically delete expired tokens.
+                IndexModel("time_expires", expireAfterSeconds=0),
+            ],
+        }
 
     @staticmethod
     async def register_user(form: RegisterForm, db: Database) -> AuthenticatedUser:
@@ -44,7 +59,7 @@ class UserService:
             raise InvalidParameterException({"email": ["Email already registered"]})
 
         # Hash password
-        password_hash = hash_password(form.password)
+        password_hash = await hash_password_async(form.password)
 
         # Create user
         user = UserWithPassword(
@@ -62,7 +77,7 @@ class UserService:
     async def login_user(form: LoginForm, db: Database) -> AuthenticatedUser:
         if userdata := await db.users.find_one({"email": form.email}):
             user = UserWithPassword(**userdata)
-            if verify_password(form.password, user.password_hash):
+            if await verify_password_async(form.password, user.password_hash):
                 token = await create_token(user_id=user.id, db=db)
                 return AuthenticatedUser(
                     user=user,
@@ -96,15 +111,26 @@ class UserService:
         if not user_id or not jti:
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-        # 🔁 ROTATION: revoke old token
+        if not ObjectId.is_valid(user_id):
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+        # 🔁 ROTATION: swap the jti in place, the old token stops matching at once
+        token, new_jti, expire = _issue_token(user_id)
         result = await db.refresh_tokens.update_one(
-            {"token": jti, "revoked": False}, {"$set": {"revoked": True}}
+            {"token": jti, "user_id": ObjectId(user_id), "revoked": {"$ne": True}},
+            {
+                "$set": {
+                    "token": new_jti,
+                    "time_expires": expire,
+                    "time_updated": datetime.now(timezone.utc),
+                }
+            },
         )
 
         if result.modified_count == 0:
             raise HTTPException(status_code=401, detail="Token revoked or invalid")
 
-        return await create_token(user_id=cast(PyObjectId, ObjectId(user_id)), db=db)
+        return token
 
     @staticmethod
     async def logout(
@@ -128,36 +154,56 @@ class UserService:
         if not user_id or not jti:
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-        await db.refresh_tokens.update_one({"token": jti}, {"$set": {"revoked": True}})
+        # Revoked tokens are purged right away instead of waiting for the TTL
+        await db.refresh_tokens.delete_one({"token": jti})
         return {"message": "Logged out successfully"}
 
     @staticmethod
-    async def require_user(
-        authorization: Annotated[HTTPAuthorizationCredentials, Depends(http_bearer)],
+    async def logout_all(
         db: Database,
-    ) -> User:
+        authorization: Annotated[HTTPAuthorizationCredentials, Depends(http_bearer)],
+    ):
+        user_id = UserService.authenticate(authorization)
 
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        # Access tokens already issued stay valid until they expire
+        result = await db.refresh_tokens.delete_many({"user_id": user_id})
+        return {
+            "message": "Logged out of all sessions",
+            "sessions": result.deleted_count,
+        }
 
-        if not authorization:
-            raise credentials_exception
+    @staticmethod
+    def authenticate(
+        authorization: Optional[HTTPAuthorizationCredentials],
+    ) -> PyObjectId:
+        """
+        Verify the bearer access token and return the id of its user.
+        """
+
+        if authorization:
+            try:
+                payload = decode_token(authorization.credentials, "access")
+                if payload["type"] == "access":
+                    return cast(PyObjectId, ObjectId(payload["sub"]))
+            except Exception:
+                pass
+
+        raise credentials_exception()
 
-        try:
-            payload = decode_token(authorization.credentials, "access")
-            if payload["type"] != "access":
-                raise HTTPException(status_code=401)
+    @staticmethod
+    async def require_user(
+        authorization: Annotated[HTTPAuthorizationCredentials, Depends(http_bearer)],
+        db: Database,
+    ) -> User:
+        user_id = UserService.authenticate(authorization)
 
-            user = await db.users.find_one({"_id": ObjectId(payload["sub"])})
-            if not user:
-                raise HTTPException(status_code=401)
+        user = user_cache.get(str(user_id))
+        if user is MISSING:
+            user = cache_user(user_id, await db.users.find_one({"_id": user_id}))
 
-            return User(**user)
-        except Exception:
-            raise credentials_exception
+        if user is None:
+            raise credentials_exception()
+        return user
 
     @staticmethod
     async def get_user_by_email(email: Email, db: Database) -> User:
@@ -168,14 +214,37 @@ class UserService:
         raise HTTPException(status_code=404, detail="User not found")
 
 
-async def create_token(user_id: PyObjectId, db: Database):
-    refresh_token, jti, expire = encode_refresh_token(str(user_id))
-    refresh_token_db = RefreshTokenInDB(user_id=user_id, token=jti, time_expires=expire)
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
-    await db.refresh_tokens.insert_one(refresh_token_db.mongo_dump())
 
-    return Token(
-        access_token=encode_access_token(str(user_id)),
+def cache_user(user_id: PyObjectId, doc: Optional[dict]) -> Optional[User]:
+    if not doc:
+        return None
+
+    user = User(**doc)
+    user_cache.set(str(user_id), user)
+    return user
+
+
+def _issue_token(user_id: str) -> tuple[Token, str, datetime]:
+    refresh_token, jti, expire = encode_refresh_token(user_id)
+    token = Token(
+        access_token=encode_access_token(user_id),
         refresh_token=refresh_token,
         token_type="bearer",
     )
+    return token, jti, expire
+
+
+async def create_token(user_id: PyObjectId, db: Database):
+    token, jti, expire = _issue_token(str(user_id))
+    refresh_token_db = RefreshTokenInDB(user_id=user_id, token=jti, time_expires=expire)
+
+    await db.refresh_tokens.insert_one(refresh_token_db.mongo_dump())
+
+    return token
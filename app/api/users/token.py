@@ -1,18 +1,55 @@
+import hashlib
+import time
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Any
+from typing import Any, Optional
 from uuid import uuid4
 from app.config import settings
+from app.utils.cache import MISSING, TTLCache
 import jwt
 
 
-def encode_access_token(user_id: str) -> str:
+def _key_ring(kid: str, secret: str, retired: str) -> dict[str, str]:
+    """
+    Map every accepted kid to its secret. `retired` is "kid:secret,..." and
+    lists secrets whose tokens are still accepted while they expire.
+    """
+    keys = dict(
+        entry.strip().split(":", 1) for entry in retired.split(",") if entry.strip()
+    )
+    keys[kid] = secret
+    return keys
+
+
+_ACCESS_KEYS = _key_ring(
+    settings.JWT_KID, settings.JWT_SECRET, settings.JWT_RETIRED_SECRETS
+)
+_REFRESH_KEYS = _key_ring(
+    settings.JWT_REFRESH_KID,
+    settings.JWT_REFRESH_SECRET,
+    settings.JWT_REFRESH_RETIRED_SECRETS,
+)
+
+# Verified access token payloads by token digest, each kept until its exp
+token_cache: TTLCache[bytes, dict[str, Any]] = TTLCache(
+    settings.TOKEN_CACHE_SIZE, settings.EXPIRE_MINUTES * 60
+)
+
+
+def encode_access_token(user_id: str, lifetime: Optional[timedelta] = None) -> str:
+    if lifetime is None:
+        lifetime = timedelta(minutes=settings.EXPIRE_MINUTES)
     payload = {
         "sub": user_id,
         "type": "access",
-        "exp": datetime.now(timezone.utc) + timedelta(minutes=settings.EXPIRE_MINUTES),
+        "exp": datetime.now(timezone.utc) + lifetime,
     }
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.ALGORITHM)
+    return jwt.encode(
+        payload,
+        settings.JWT_SECRET,
+        algorithm=settings.ALGORITHM,
+        headers={"kid": settings.JWT_KID},
+    )
 
 
 def encode_refresh_token(user_id: str) -> tuple[str, str, datetime]:
@@ -28,17 +65,41 @@ def encode_refresh_token(user_id: str) -> tuple[str, str, datetime]:
     }
 
     token = jwt.encode(
-        payload, settings.JWT_REFRESH_SECRET, algorithm=settings.ALGORITHM
+        payload,
+        settings.JWT_REFRESH_SECRET,
+        algorithm=settings.ALGORITHM,
+        headers={"kid": settings.JWT_REFRESH_KID},
     )
 
     return token, jti, expire
 
 
+def _verify(token: str, keys: dict[str, str], current: str) -> dict[str, Any]:
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is not None:
+        if kid not in keys:
+            raise jwt.InvalidKeyError(f"Unknown kid {kid}")
+        return jwt.decode(token, keys[kid], algorithms=[settings.ALGORITHM])
+
+    # Tokens issued before kid headers, signed with the current or a retired key
+    candidates = [current] + [key for key in keys.values() if key != current]
+    for key in candidates[:-1]:
+        try:
+            return jwt.decode(token, key, algorithms=[settings.ALGORITHM])
+        except jwt.InvalidSignatureError:
+            continue
+    return jwt.decode(token, candidates[-1], algorithms=[settings.ALGORITHM])
+
+
 def decode_token(token: str, type: str) -> dict[str, Any]:
     if type == "access":
-        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.ALGORITHM])
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = token_cache.get(digest)
+        if payload is MISSING:
+            payload = _verify(token, _ACCESS_KEYS, settings.JWT_SECRET)
+            ttl = min(payload.get("exp", 0) - time.time(), token_cache.ttl)
+            token_cache.set(digest, payload, ttl)
+        return payload
     elif type == "refresh":
-        return jwt.decode(
-            token, settings.JWT_REFRESH_SECRET, algorithms=[settings.ALGORITHM]
-        )
+        return _verify(token, _REFRESH_KEYS, settings.JWT_REFRESH_SECRET)
     return {}
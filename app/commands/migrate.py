@@ -0,0 +1,47 @@
+"""
+Build the indexes and run the data migrations the code expects, ahead of a
+deploy. Workers then find the schema current and skip the work on startup.
+
+    python -m app.commands.migrate [--indexes-only] [--check]
+"""
+
+import argparse
+import asyncio
+import sys
+
+from app.config import settings
+from app.database import create_client
+from app.migrations.runner import migrate, schema_is_current
+
+
+async def main(indexes_only: bool, check: bool) -> int:
+    client = create_client()
+    try:
+        db = client[settings.DB_NAME]
+        if check:
+            current = await schema_is_current(db)
+            print("Schema is current" if current else "Schema is out of date")
+            return 0 if current else 1
+
+        changes = await migrate(db, data=not indexes_only)
+        for change in changes:
+            print(change)
+        if not changes:
+            print("Schema is current")
+        return 0
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--indexes-only", action="store_true", help="Skip the data migrations"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only report, exit with 1 when a migration is pending",
+    )
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.indexes_only, args.check)))
@@ -0,0 +1,24 @@
+"""
+Rebuild the per-endpoint comment counters from the comments collection.
+
+    python -m app.commands.rebuild_comment_counters
+"""
+
+import asyncio
+
+from app.api.comments.service import CommentService
+from app.config import settings
+from app.database import create_client
+
+
+async def main() -> None:
+    client = create_client()
+    try:
+        rebuilt = await CommentService.rebuild_counters(client[settings.DB_NAME])
+        print(f"Rebuilt {rebuilt} comment counters")
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
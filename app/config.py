@@ -7,11 +7,79 @@ load_dotenv()
 class Settings:
     MONGODB_URL: str = os.environ["MONGODB_URL"]
     DB_NAME: str = os.environ["DB_NAME"]
+    # "memory" runs on an in-process database instead of MONGODB_URL, for
+    # tests, local runs and benchmarks without a server. Data is lost on exit
+    DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "mongodb")
+    # Connection pool per server
+    MONGODB_MAX_POOL_SIZE = int(os.environ.get("MONGODB_MAX_POOL_SIZE", 100))
+    # Opened at startup and kept open, so the first requests don't connect
+    MONGODB_MIN_POOL_SIZE = int(os.environ.get("MONGODB_MIN_POOL_SIZE", 0))
+    # 0 waits for a free connection (or keeps idle ones) without limit
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(
+        os.environ.get("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 0)
+    )
+    MONGODB_MAX_IDLE_TIME_MS = int(os.environ.get("MONGODB_MAX_IDLE_TIME_MS", 0))
+    # Wire compression, in order of preference, as "zstd,snappy,zlib"
+    MONGODB_COMPRESSORS = os.environ.get("MONGODB_COMPRESSORS", "")
+    # Log commands slower than this with their filter shape, 0 disables it
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 0))
+    # Also explain each slow query shape once, flagging collection scans and
+    # plans examining more than SLOW_QUERY_DOCS_RATIO documents per result
+    SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "").lower() in (
+        "1",
+        "true",
+    )
+    SLOW_QUERY_DOCS_RATIO = float(os.environ.get("SLOW_QUERY_DOCS_RATIO", 10))
+    # Fail requests going over their db_budget instead of logging a warning
+    DB_BUDGET_STRICT = os.environ.get("DB_BUDGET_STRICT", "").lower() in ("1", "true")
     JWT_SECRET = os.environ["JWT_SECRET"]
     JWT_REFRESH_SECRET = os.environ["JWT_REFRESH_SECRET"]
+    # Key ids of the signing secrets, sent as the token kid header
+    JWT_KID = os.environ.get("JWT_KID", "1")
+    JWT_REFRESH_KID = os.environ.get("JWT_REFRESH_KID", "1")
+    # Previous secrets still accepted after a rotation, as "kid:secret,kid:secret"
+    JWT_RETIRED_SECRETS = os.environ.get("JWT_RETIRED_SECRETS", "")
+    JWT_REFRESH_RETIRED_SECRETS = os.environ.get("JWT_REFRESH_RETIRED_SECRETS", "")
     ALGORITHM = "HS256"
     EXPIRE_MINUTES = 30
     REFRESH_EXPIRE_DAYS = 7
+    # Verified access token payloads, 0 disables the cache
+    TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+    # Authenticated user cache behind UserService.require_user, 0 disables it
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", 60))
+    # Team role cache behind the CurrentTeam* dependencies, 0 disables it
+    MEMBERSHIP_CACHE_SIZE = int(os.environ.get("MEMBERSHIP_CACHE_SIZE", 10000))
+    MEMBERSHIP_CACHE_TTL_SECONDS = float(
+        os.environ.get("MEMBERSHIP_CACHE_TTL_SECONDS", 30)
+    )
+    # Non-members are remembered briefly so they can't hammer the DB
+    MEMBERSHIP_NEGATIVE_TTL_SECONDS = float(
+        os.environ.get("MEMBERSHIP_NEGATIVE_TTL_SECONDS", 5)
+    )
+    # Serialized GET responses (comments, team members, my teams), a TTL of 0
+    # disables the cache. Writes of other workers show up after the TTL
+    RESPONSE_CACHE_MAX_BYTES = int(
+        os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 10))
+    # Soft-deleted comments, teams and members are purged after this long
+    SOFT_DELETE_RETENTION_SECONDS = int(
+        os.environ.get("SOFT_DELETE_RETENTION_SECONDS", 90 * 24 * 60 * 60)
+    )
+    # bcrypt thread pool, logins beyond the queue limit get a 503
+    PASSWORD_HASH_WORKERS = int(
+        os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+    )
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 64))
+    # Live comment feed: events buffered per connection before it is dropped.
+    # At least 1, asyncio.Queue is unbounded for sizes <= 0
+    COMMENT_FEED_QUEUE_SIZE = max(
+        1, int(os.environ.get("COMMENT_FEED_QUEUE_SIZE", 100))
+    )
+    COMMENT_FEED_HEARTBEAT_SECONDS = float(
+        os.environ.get("COMMENT_FEED_HEARTBEAT_SECONDS", 15)
+    )
 
 
 settings = Settings()
@@ -1,20 +1,64 @@
-from typing import Annotated
+import asyncio
+from typing import Annotated, Any, Optional, cast
 
 from fastapi import FastAPI, Request, Depends
 from pymongo import AsyncMongoClient
 from pymongo.asynchronous.database import AsyncDatabase
 from app.config import settings
+from app.memory_mongo.client import MemoryMongoClient
+from app.monitoring.diagnostics import query_diagnostics
+from app.monitoring.metrics import command_metrics
+from app.monitoring.pool import pool_monitor
+
+
+_memory_client: Optional[MemoryMongoClient] = None
+
+
+def create_client() -> AsyncMongoClient:
+    if settings.DATABASE_BACKEND == "memory":
+        return cast(AsyncMongoClient, _get_memory_client())
+
+    options: dict[str, Any] = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+    }
+    if settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGODB_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = settings.MONGODB_MAX_IDLE_TIME_MS
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+
+    return AsyncMongoClient(
+        settings.MONGODB_URL,
+        event_listeners=[pool_monitor, command_metrics, query_diagnostics],
+        **options,
+    )
+
+
+def _get_memory_client() -> MemoryMongoClient:
+    # One per process, so every client sees the same data
+    global _memory_client
+    if _memory_client is None:
+        _memory_client = MemoryMongoClient(
+            event_listeners=[command_metrics, query_diagnostics]
+        )
+    return _memory_client
 
 
 async def open_connection(app: FastAPI) -> AsyncDatabase:
-    client = AsyncMongoClient(settings.MONGODB_URL)
+    client = create_client()
     db = client[settings.DB_NAME]
 
     app.state.mongodb_client = client
     app.state.database = db
+    query_diagnostics.attach(client)
 
-    # Ensure connection
-    await db.command("ping")
+    # Ensure connection, concurrent pings open the minPoolSize connections now
+    # instead of on the first requests
+    await asyncio.gather(
+        *(db.command("ping") for _ in range(max(settings.MONGODB_MIN_POOL_SIZE, 1)))
+    )
 
     print("Database connected")
     return db
@@ -0,0 +1,160 @@
+"""
+In-process stand-in for AsyncMongoClient, selected with DATABASE_BACKEND=memory
+so the app, the commands and the load benchmarks run without a server.
+
+Documents and indexes live in this process only. Commands still reach the
+command listeners, so metrics, slow query logs and db_budget checks keep
+working, and `explain` reports the keys and documents a query examined.
+Not supported: transactions, sessions, change streams, TTL expiry, $lookup
+with `let`, and array (multikey) index lookups, which fall back to scans.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Iterable, Optional, TypeVar, Union
+
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+
+from app.memory_mongo.collection import MemoryCollection
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# What command events report as the server
+ADDRESS = ("memory", 0)
+
+
+class MemoryDatabase:
+    def __init__(self, client: "MemoryMongoClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    async def list_collection_names(self, **kwargs) -> list[str]:
+        return [name for name, c in self._collections.items() if c._docs]
+
+    async def drop_collection(self, name: str, **kwargs) -> None:
+        self._collections.pop(name, None)
+
+    async def command(
+        self, command: Union[str, dict], value: Any = 1, **kwargs
+    ) -> dict[str, Any]:
+        if isinstance(command, str):
+            command = {command: value, **kwargs}
+        name = next(iter(command))
+
+        def run() -> dict[str, Any]:
+            if name == "ping":
+                return {"ok": 1.0}
+            if name == "explain":
+                explained = command["explain"]
+                return self[explained[next(iter(explained))]]._explain(explained)
+            raise OperationFailure(f"no such command: '{name}'", code=59)
+
+        await asyncio.sleep(0)
+        return self.client._publish(self.name, command, run)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """
+        Query costs per collection, see MemoryCollection.stats.
+        """
+        return {name: c.stats() for name, c in sorted(self._collections.items())}
+
+
+class MemoryMongoClient:
+    def __init__(self, event_listeners: Optional[Iterable[Any]] = None):
+        self._listeners = [
+            listener
+            for listener in event_listeners or []
+            if isinstance(listener, monitoring.CommandListener)
+        ]
+        self._databases: dict[str, MemoryDatabase] = {}
+        self._request_ids = itertools.count(1)
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return self.get_database(name)
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    async def drop_database(self, name: str) -> None:
+        self._databases.pop(name, None)
+
+    async def close(self) -> None:
+        # The data outlives the connection, like a server's would
+        pass
+
+    def _publish(self, database: str, command: dict, run: Callable[[], T]) -> T:
+        """
+        Run a command, reporting it to the command listeners as one round
+        trip.
+        """
+        if not self._listeners:
+            return run()
+
+        name = next(iter(command))
+        request_id = next(self._request_ids)
+        self._notify(
+            "started",
+            monitoring.CommandStartedEvent(
+                command, database, request_id, ADDRESS, request_id
+            ),
+        )
+        start = time.perf_counter()
+        try:
+            result = run()
+        except Exception as e:
+            self._notify(
+                "failed",
+                monitoring.CommandFailedEvent(
+                    timedelta(seconds=time.perf_counter() - start),
+                    {"ok": 0, "errmsg": str(e), "code": getattr(e, "code", None)},
+                    name,
+                    request_id,
+                    ADDRESS,
+                    request_id,
+                    database_name=database,
+                ),
+            )
+            raise
+        self._notify(
+            "succeeded",
+            monitoring.CommandSucceededEvent(
+                timedelta(seconds=time.perf_counter() - start),
+                {"ok": 1},
+                name,
+                request_id,
+                ADDRESS,
+                request_id,
+                database_name=database,
+            ),
+        )
+        return result
+
+    def _notify(self, method: str, event: Any) -> None:
+        for listener in self._listeners:
+            try:
+                getattr(listener, method)(event)
+            except Exception:
+                # Like pymongo, a failing listener doesn't fail the command
+                logger.exception("Command listener %r failed", listener)
@@ -0,0 +1,975 @@
+import asyncio
+import itertools
+from collections import deque
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Union,
+)
+
+import bson
+from bson import ObjectId
+from pymongo import (
+    DeleteMany,
+    DeleteOne,
+    IndexModel,
+    InsertOne,
+    ReplaceOne,
+    ReturnDocument,
+    UpdateMany,
+    UpdateOne,
+)
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from app.memory_mongo import indexes
+from app.memory_mongo.indexes import Index, Plan
+from app.memory_mongo.query import (
+    _MISSING,
+    _set_path,
+    apply_update,
+    equality_fields,
+    get_path,
+    matches,
+    project,
+    resolve,
+    sort_documents,
+    sort_key,
+)
+
+if TYPE_CHECKING:
+    from app.memory_mongo.client import MemoryDatabase
+
+SortSpec = Union[str, list[tuple[str, int]], Mapping[str, int], None]
+
+
+def _copy(doc: Mapping[str, Any]) -> dict:
+    # A BSON round trip, so stored documents look like ones read from a
+    # server: naive UTC datetimes in milliseconds, lists instead of tuples
+    return bson.decode(bson.encode(doc))
+
+
+def _sort_list(key_or_list: SortSpec, direction: Optional[int] = None) -> list:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, Mapping):
+        return list(key_or_list.items())
+    return [tuple(item) for item in key_or_list]
+
+
+@dataclass
+class ExecutionStats:
+    keys_examined: int = 0
+    docs_examined: int = 0
+    returned: int = 0
+
+    def add(self, other: "ExecutionStats") -> None:
+        self.keys_examined += other.keys_examined
+        self.docs_examined += other.docs_examined
+        self.returned += other.returned
+
+
+# Documents per batch when the cursor sets no batch size, the server's
+# default first batch
+DEFAULT_BATCH_SIZE = 101
+
+_cursor_ids = itertools.count(1)
+
+
+class MemoryCursor:
+    """
+    Results of a find or aggregate, read lazily: the command returns the
+    first batch and each getMore the next one, so like a server cursor it
+    only holds one batch of copied documents at a time.
+    """
+
+    def __init__(
+        self,
+        collection: "MemoryCollection",
+        command: dict,
+        source: Callable[[], Iterable[dict]],
+        batch_size: int = 0,
+    ):
+        self._collection = collection
+        self._command = command
+        self._source = source
+        self._batch_size = batch_size
+        self._id = 0
+        self._iterator: Optional[Iterator[dict]] = None
+        self._batch: deque = deque()
+        self._started = False
+
+    def _take(self) -> list[dict]:
+        assert self._iterator is not None
+        batch = list(islice(self._iterator, self._batch_size or DEFAULT_BATCH_SIZE))
+        # Look one ahead so an exhausted cursor needs no empty getMore
+        following = next(self._iterator, _MISSING)
+        if following is _MISSING:
+            self._iterator = None
+        else:
+            self._iterator = chain([following], self._iterator)
+        return batch
+
+    async def _refill(self) -> bool:
+        """
+        Fetch the next batch once the current one is used up. Returns
+        whether there is a document to read.
+        """
+        if self._batch:
+            return True
+        if not self._started:
+            self._started = True
+
+            def first() -> list[dict]:
+                self._iterator = iter(self._source())
+                return self._take()
+
+            self._id = next(_cursor_ids)
+            self._batch.extend(await self._collection._command(self._command, first))
+        elif self._iterator is not None:
+            command: dict[str, Any] = {
+                "getMore": self._id,
+                "collection": self._collection.name,
+            }
+            if self._batch_size:
+                command["batchSize"] = self._batch_size
+            self._batch.extend(await self._collection._command(command, self._take))
+        return bool(self._batch)
+
+    def __aiter__(self) -> "MemoryCursor":
+        return self
+
+    async def __anext__(self) -> dict:
+        if not await self._refill():
+            raise StopAsyncIteration
+        return self._batch.popleft()
+
+    async def next(self) -> dict:
+        return await self.__anext__()
+
+    async def to_list(self, length: Optional[int] = None) -> list[dict]:
+        results: list[dict] = []
+        while (length is None or len(results) < length) and await self._refill():
+            count = len(self._batch)
+            if length is not None:
+                count = min(count, length - len(results))
+            results += [self._batch.popleft() for _ in range(count)]
+        return results
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        self._batch_size = batch_size
+        return self
+
+    async def close(self) -> None:
+        self._started = True
+        self._iterator = None
+        self._batch.clear()
+
+
+class MemoryFindCursor(MemoryCursor):
+    def __init__(
+        self,
+        collection: "MemoryCollection",
+        filter: Optional[dict],
+        projection: Optional[Any],
+        skip: int = 0,
+        limit: int = 0,
+        sort: SortSpec = None,
+        batch_size: int = 0,
+    ):
+        super().__init__(collection, {}, self._results, batch_size)
+        self._filter = filter or {}
+        self._projection = projection
+        self._sort = _sort_list(sort)
+        self._skip = skip
+        self._limit = limit
+
+    def sort(self, key_or_list: SortSpec, direction: Optional[int] = None):
+        self._sort = _sort_list(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryFindCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryFindCursor":
+        self._limit = limit
+        return self
+
+    async def _refill(self) -> bool:
+        if not self._started:
+            command = {"find": self._collection.name, "filter": self._filter}
+            if self._sort:
+                command["sort"] = dict(self._sort)
+            if self._projection:
+                command["projection"] = self._projection
+            if self._skip:
+                command["skip"] = self._skip
+            if self._limit:
+                command["limit"] = self._limit
+            if self._batch_size:
+                command["batchSize"] = self._batch_size
+            self._command = command
+        return await super()._refill()
+
+    def _results(self) -> Iterator[dict]:
+        projection = _projection_dict(self._projection)
+        for doc in self._collection._select(
+            self._filter, self._sort, self._skip, self._limit
+        ):
+            yield project(_copy(doc), projection)
+
+
+def _projection_dict(projection: Any) -> Optional[dict]:
+    if projection is None or isinstance(projection, Mapping):
+        return projection
+    return {field: 1 for field in projection}
+
+
+class MemoryCollection:
+    """
+    The subset of AsyncCollection the services use, over documents kept in
+    a dict by _id and maintained indexes.
+    """
+
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._docs: dict[tuple, dict] = {}
+        self._indexes: dict[str, Index] = {"_id_": Index.primary()}
+        self._stats = ExecutionStats()
+        self._collection_scans = 0
+        self._index_scans = 0
+
+    def stats(self) -> dict[str, Any]:
+        """
+        What the queries cost so far, the number to compare between two
+        versions of a query or index.
+        """
+        return {
+            "documents": len(self._docs),
+            "indexes": len(self._indexes),
+            "collection_scans": self._collection_scans,
+            "index_scans": self._index_scans,
+            "keys_examined": self._stats.keys_examined,
+            "docs_examined": self._stats.docs_examined,
+            "returned": self._stats.returned,
+        }
+
+    async def _command(self, command: dict, run):
+        # Yield like a round trip would, then run atomically
+        await asyncio.sleep(0)
+        return self.database.client._publish(self.database.name, command, run)
+
+    # Reads
+
+    def _plan(self, filter: dict, sort: list) -> Plan:
+        return indexes.plan(list(self._indexes.values()), filter, sort)
+
+    def _select(
+        self,
+        filter: Optional[dict],
+        sort: Optional[list] = None,
+        skip: int = 0,
+        limit: int = 0,
+        stats: Optional[ExecutionStats] = None,
+    ) -> Iterator[dict]:
+        """
+        Stored documents matching the filter, in order. Lazy, so a limit
+        stops the index walk early, consume it before writing.
+        """
+        filter = filter or {}
+        sort = sort or []
+        plan = self._plan(filter, sort)
+        run = ExecutionStats()
+
+        def source() -> Iterator[dict]:
+            if plan.index is None:
+                self._collection_scans += 1
+                for doc in list(self._docs.values()):
+                    run.docs_examined += 1
+                    yield doc
+                return
+            self._index_scans += 1
+            seen: set[tuple] = set()
+            for entry in indexes.walk(plan):
+                run.keys_examined += 1
+                key = entry[-1][1]
+                if len(plan.ranges) > 1:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                if (doc := self._docs.get(key)) is not None:
+                    run.docs_examined += 1
+                    yield doc
+
+        docs: Iterable[dict] = (doc for doc in source() if matches(doc, filter))
+        if sort and not plan.ordered:
+            docs = sort_documents(list(docs), sort)
+        end = skip + limit if limit else None
+        try:
+            for doc in islice(docs, skip, end):
+                run.returned += 1
+                yield doc
+        finally:
+            self._stats.add(run)
+            if stats is not None:
+                stats.add(run)
+
+    async def find_one(
+        self, filter: Optional[Any] = None, projection: Optional[Any] = None, **kwargs
+    ) -> Optional[dict]:
+        if filter is not None and not isinstance(filter, Mapping):
+            filter = {"_id": filter}
+        cursor = self.find(filter, projection, sort=kwargs.get("sort"), limit=1)
+        docs = await cursor.to_list(1)
+        return docs[0] if docs else None
+
+    def find(
+        self,
+        filter: Optional[dict] = None,
+        projection: Optional[Any] = None,
+        skip: int = 0,
+        limit: int = 0,
+        sort: SortSpec = None,
+        **kwargs,
+    ) -> MemoryFindCursor:
+        return MemoryFindCursor(
+            self, filter, projection, skip, limit, sort, kwargs.get("batch_size", 0)
+        )
+
+    async def count_documents(self, filter: dict, **kwargs) -> int:
+        pipeline: list[dict] = [{"$match": filter}]
+        if kwargs.get("skip"):
+            pipeline.append({"$skip": kwargs["skip"]})
+        if kwargs.get("limit"):
+            pipeline.append({"$limit": kwargs["limit"]})
+        pipeline.append({"$group": {"_id": 1, "n": {"$sum": 1}}})
+        command = {"aggregate": self.name, "pipeline": pipeline}
+        results = await self._command(command, lambda: self._aggregate(pipeline))
+        return results[0]["n"] if results else 0
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return await self._command({"count": self.name}, lambda: len(self._docs))
+
+    async def aggregate(self, pipeline: list[dict], **kwargs) -> MemoryCursor:
+        command = {"aggregate": self.name, "pipeline": pipeline, "cursor": {}}
+        batch_size = kwargs.get("batchSize", 0)
+        if batch_size:
+            command["cursor"] = {"batchSize": batch_size}
+        cursor = MemoryCursor(
+            self, command, lambda: self._pipeline(pipeline), batch_size
+        )
+        # Like the server, the command runs now, not on first read
+        await cursor._refill()
+        return cursor
+
+    def _aggregate(
+        self, pipeline: list[dict], stats: Optional[ExecutionStats] = None
+    ) -> list[dict]:
+        return list(self._pipeline(pipeline, stats))
+
+    def _pipeline(
+        self, pipeline: list[dict], stats: Optional[ExecutionStats] = None
+    ) -> Iterable[dict]:
+        filter, sort, stages = _pipeline_source(pipeline)
+        docs: Iterable[dict] = (
+            _copy(doc) for doc in self._select(filter, sort, stats=stats)
+        )
+        for stage in stages:
+            docs = self._stage(stage, docs)
+        return docs
+
+    def _stage(self, stage: dict, docs: Iterable[dict]) -> Iterable[dict]:
+        (name, spec), *rest = stage.items()
+        if rest:
+            raise OperationFailure(
+                "A pipeline stage specification object must "
+                "contain exactly one field.",
+                code=40323,
+            )
+        if name == "$match":
+            return (doc for doc in docs if matches(doc, spec))
+        if name == "$sort":
+            return sort_documents(list(docs), _sort_list(spec))
+        if name == "$limit":
+            return islice(docs, spec)
+        if name == "$skip":
+            return islice(docs, spec, None)
+        if name == "$project":
+            return (project(doc, spec) for doc in docs)
+        if name == "$unwind":
+            return _unwind(spec, docs)
+        if name == "$lookup":
+            return (self._lookup(spec, doc) for doc in docs)
+        if name == "$group":
+            return _group(spec, docs)
+        if name == "$count":
+            count = sum(1 for _ in docs)
+            return [{spec: count}] if count else []
+        raise OperationFailure(
+            f"Unrecognized pipeline stage name: '{name}'", code=40324
+        )
+
+    def _lookup(self, spec: dict, doc: dict) -> dict:
+        foreign = self.database[spec["from"]]
+        pipeline = list(spec.get("pipeline", []))
+        if "localField" in spec:
+            local = get_path(doc, spec["localField"])
+            if local is _MISSING:
+                local = None
+            condition = {"$in": local} if isinstance(local, list) else local
+            match = {spec["foreignField"]: condition}
+            # One $match, so the foreign field and the pipeline's filter
+            # plan together
+            if pipeline and "$match" in pipeline[0]:
+                first = pipeline[0]["$match"]
+                if not set(first) & set(match):
+                    pipeline[0] = {"$match": {**match, **first}}
+                else:
+                    pipeline.insert(0, {"$match": match})
+            else:
+                pipeline.insert(0, {"$match": match})
+        elif "let" in spec:
+            raise OperationFailure("$lookup with let is not supported", code=2)
+        joined = foreign._aggregate(pipeline)
+        result = dict(doc)
+        _set_path(result, spec["as"], joined)
+        return result
+
+    # Writes
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+
+        def run():
+            self._insert(_copy(document))
+            return InsertOneResult(document["_id"], True)
+
+        command = {"insert": self.name, "documents": [document]}
+        return await self._command(command, run)
+
+    async def insert_many(
+        self, documents: Iterable[dict], ordered: bool = True, **kwargs
+    ) -> InsertManyResult:
+        documents = list(documents)
+        for document in documents:
+            if "_id" not in document:
+                document["_id"] = ObjectId()
+
+        def run():
+            errors = self._insert_many(
+                [_copy(document) for document in documents], ordered
+            )
+            if errors:
+                raise BulkWriteError(
+                    _bulk_result(
+                        nInserted=len(documents) - len(errors), writeErrors=errors
+                    )
+                )
+            return InsertManyResult([document["_id"] for document in documents], True)
+
+        command = {"insert": self.name, "documents": documents, "ordered": ordered}
+        return await self._command(command, run)
+
+    async def update_one(
+        self, filter: dict, update: dict, upsert: bool = False, **kwargs
+    ) -> UpdateResult:
+        return await self._update_command(filter, update, upsert, multi=False)
+
+    async def update_many(
+        self, filter: dict, update: dict, upsert: bool = False, **kwargs
+    ) -> UpdateResult:
+        return await self._update_command(filter, update, upsert, multi=True)
+
+    async def replace_one(
+        self, filter: dict, replacement: dict, upsert: bool = False, **kwargs
+    ) -> UpdateResult:
+        return await self._update_command(filter, replacement, upsert, multi=False)
+
+    async def _update_command(
+        self, filter: dict, update: dict, upsert: bool, multi: bool
+    ) -> UpdateResult:
+        def run():
+            matched, modified, upserted_id, _, _ = self._update(
+                filter, update, upsert, multi
+            )
+            raw = {"n": matched + (upserted_id is not None), "nModified": modified}
+            if upserted_id is not None:
+                raw["upserted"] = upserted_id
+            return UpdateResult(raw, True)
+
+        command = {
+            "update": self.name,
+            "updates": [{"q": filter, "u": update, "upsert": upsert, "multi": multi}],
+        }
+        return await self._command(command, run)
+
+    async def find_one_and_update(
+        self,
+        filter: dict,
+        update: dict,
+        projection: Optional[Any] = None,
+        sort: SortSpec = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs,
+    ) -> Optional[dict]:
+        def run():
+            _, _, _, before, after = self._update(
+                filter, update, upsert, multi=False, sort=_sort_list(sort)
+            )
+            doc = after if return_document else before
+            return None if doc is None else project(doc, _projection_dict(projection))
+
+        command = {
+            "findAndModify": self.name,
+            "query": filter,
+            "update": update,
+            "upsert": upsert,
+            "new": bool(return_document),
+        }
+        return await self._command(command, run)
+
+    async def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        return await self._delete_command(filter, multi=False)
+
+    async def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        return await self._delete_command(filter, multi=True)
+
+    async def _delete_command(self, filter: dict, multi: bool) -> DeleteResult:
+        def run():
+            return DeleteResult({"n": self._delete(filter, multi)}, True)
+
+        command = {
+            "delete": self.name,
+            "deletes": [{"q": filter, "limit": 0 if multi else 1}],
+        }
+        return await self._command(command, run)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs):
+        def run():
+            result = _bulk_result()
+            for i, request in enumerate(requests):
+                try:
+                    self._bulk_one(request, i, result)
+                except DuplicateKeyError as e:
+                    result["writeErrors"].append({**(e.details or {}), "index": i})
+                    if ordered:
+                        break
+            if result["writeErrors"]:
+                raise BulkWriteError(result)
+            return BulkWriteResult(result, True)
+
+        command = {"bulkWrite": self.name, "ops": len(requests), "ordered": ordered}
+        return await self._command(command, run)
+
+    def _bulk_one(self, request: Any, i: int, result: dict) -> None:
+        if isinstance(request, InsertOne):
+            document = request._doc
+            if "_id" not in document:
+                document["_id"] = ObjectId()
+            self._insert(_copy(document))
+            result["nInserted"] += 1
+        elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+            matched, modified, upserted_id, _, _ = self._update(
+                request._filter,
+                request._doc,
+                bool(request._upsert),
+                multi=isinstance(request, UpdateMany),
+            )
+            result["nMatched"] += matched
+            result["nModified"] += modified
+            if upserted_id is not None:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": i, "_id": upserted_id})
+        elif isinstance(request, (DeleteOne, DeleteMany)):
+            result["nRemoved"] += self._delete(
+                request._filter, multi=isinstance(request, DeleteMany)
+            )
+        else:
+            raise TypeError(f"{request!r} is not a valid request")
+
+    def _insert(self, doc: dict) -> None:
+        if sort_key(doc["_id"]) in self._docs:
+            raise _duplicate_key(self, self._indexes["_id_"], doc)
+        for index in self._indexes.values():
+            if index.conflicts(doc):
+                raise _duplicate_key(self, index, doc)
+        self._docs[sort_key(doc["_id"])] = doc
+        for index in self._indexes.values():
+            index.add(doc)
+
+    def _insert_many(self, docs: list[dict], ordered: bool) -> list[dict]:
+        """
+        Insert a batch, indexing it in one pass. Returns the write errors.
+        """
+        unique = [index for index in self._indexes.values() if index.unique]
+        taken: dict[str, set] = {index.name: set() for index in unique}
+        accepted, errors = [], []
+        for i, doc in enumerate(docs):
+            for index in unique:
+                key = index.key(doc) if index.covers(doc) else None
+                if key is not None and (
+                    key in taken[index.name]
+                    or index.conflicts(doc)
+                    or (index.name == "_id_" and sort_key(doc["_id"]) in self._docs)
+                ):
+                    details = _duplicate_key(self, index, doc).details or {}
+                    errors.append({**details, "index": i})
+                    break
+            else:
+                accepted.append(doc)
+                for index in unique:
+                    if index.covers(doc):
+                        taken[index.name].add(index.key(doc))
+                continue
+            if ordered:
+                break
+
+        for doc in accepted:
+            self._docs[sort_key(doc["_id"])] = doc
+        for index in self._indexes.values():
+            index.add_many(accepted)
+        return errors
+
+    def _replace(self, old: dict, new: dict) -> None:
+        for index in self._indexes.values():
+            if index.conflicts(new):
+                raise _duplicate_key(self, index, new)
+        for index in self._indexes.values():
+            index.remove(old)
+            index.add(new)
+        self._docs[sort_key(new["_id"])] = new
+
+    def _update(
+        self,
+        filter: dict,
+        update: dict,
+        upsert: bool,
+        multi: bool,
+        sort: Optional[list] = None,
+    ) -> tuple[int, int, Any, Optional[dict], Optional[dict]]:
+        """
+        Returns (matched, modified, upserted _id, last document before,
+        last document after).
+        """
+        replacement = bool(update) and not next(iter(update)).startswith("$")
+        targets = list(self._select(filter, sort, limit=0 if multi else 1))
+        modified = 0
+        before = after = None
+        for doc in targets:
+            before = _copy(doc)
+            if replacement:
+                new = _copy({**update, "_id": doc["_id"]})
+                changed = sort_key(new) != sort_key(doc)
+            else:
+                new = _copy(doc)
+                changed = apply_update(new, update)
+                if sort_key(new.get("_id")) != sort_key(doc["_id"]):
+                    raise OperationFailure(
+                        "Performing an update on the path '_id' would modify the "
+                        "immutable field '_id'",
+                        code=66,
+                    )
+            if changed:
+                self._replace(doc, _copy(new))
+                modified += 1
+            after = new
+
+        if targets or not upsert:
+            return len(targets), modified, None, before, after
+
+        new = {}
+        for path, value in equality_fields(filter).items():
+            _set_path(new, path, value)
+        if replacement:
+            new = {**update, **({"_id": new["_id"]} if "_id" in new else {})}
+        else:
+            apply_update(new, update, inserting=True)
+        new.setdefault("_id", ObjectId())
+        new = _copy(new)
+        self._insert(new)
+        return 0, 0, new["_id"], None, _copy(new)
+
+    def _delete(self, filter: dict, multi: bool) -> int:
+        targets = list(self._select(filter, limit=0 if multi else 1))
+        for doc in targets:
+            for index in self._indexes.values():
+                index.remove(doc)
+            del self._docs[sort_key(doc["_id"])]
+        return len(targets)
+
+    # Indexes
+
+    async def create_index(self, keys: Any, **kwargs) -> str:
+        names = await self.create_indexes([IndexModel(keys, **kwargs)])
+        return names[0]
+
+    async def create_indexes(self, indexes: list[IndexModel], **kwargs) -> list[str]:
+        def run():
+            names = []
+            for model in indexes:
+                index = Index(model)
+                names.append(index.name)
+                existing = self._indexes.get(index.name)
+                if existing is not None:
+                    if existing.fields != index.fields:
+                        raise OperationFailure(
+                            f"An existing index has the same name as the requested "
+                            f"index: {index.name}",
+                            code=86,
+                        )
+                    if _options(existing) != _options(index):
+                        raise OperationFailure(
+                            f"An existing index has the same name but different "
+                            f"options: {index.name}",
+                            code=85,
+                        )
+                    continue
+                for other in self._indexes.values():
+                    # The same key can be indexed twice only for different subsets
+                    if other.fields == index.fields and other.partial == index.partial:
+                        raise OperationFailure(
+                            f"Index already exists with a different name: "
+                            f"{other.name}",
+                            code=85,
+                        )
+                self._build(index)
+            return names
+
+        command = {
+            "createIndexes": self.name,
+            "indexes": [model.document for model in indexes],
+        }
+        return await self._command(command, run)
+
+    def _build(self, index: Index) -> None:
+        covered = [doc for doc in self._docs.values() if index.covers(doc)]
+        index.multikey = any(
+            isinstance(get_path(doc, path), list)
+            for doc in covered
+            for path, _ in index.fields
+        )
+        index.entries = sorted(
+            (*index.key(doc), (1, sort_key(doc["_id"]))) for doc in covered
+        )
+        if index.unique:
+            for previous, entry in zip(index.entries, index.entries[1:]):
+                if previous[:-1] == entry[:-1]:
+                    doc = self._docs[entry[-1][1]]
+                    raise _duplicate_key(self, index, doc)
+        self._indexes[index.name] = index
+
+    async def list_indexes(self, **kwargs) -> MemoryCursor:
+        cursor = MemoryCursor(
+            self,
+            {"listIndexes": self.name},
+            lambda: [_copy(index.document) for index in self._indexes.values()],
+        )
+        await cursor._refill()
+        return cursor
+
+    async def index_information(self) -> dict[str, dict]:
+        cursor = await self.list_indexes()
+        return {
+            index.pop("name"): {**index, "key": list(index["key"].items())}
+            async for index in cursor
+        }
+
+    async def drop_index(self, index_or_name: Any, **kwargs) -> None:
+        name = index_or_name
+        if not isinstance(name, str):
+            name = IndexModel(index_or_name).document["name"]
+
+        def run():
+            if name == "_id_":
+                raise OperationFailure("cannot drop _id index", code=72)
+            if self._indexes.pop(name, None) is None:
+                raise OperationFailure(f"index not found with name [{name}]", code=27)
+
+        await self._command({"dropIndexes": self.name, "index": name}, run)
+
+    async def drop_indexes(self, **kwargs) -> None:
+        def run():
+            for name in [name for name in self._indexes if name != "_id_"]:
+                del self._indexes[name]
+
+        await self._command({"dropIndexes": self.name, "index": "*"}, run)
+
+    async def drop(self, **kwargs) -> None:
+        await self.database.drop_collection(self.name)
+
+    def _explain(self, command: dict) -> dict:
+        """
+        Plan and execution stats of a find, aggregate, count, update or
+        delete, shaped like the server's explain output.
+        """
+        stats = ExecutionStats()
+        name = next(iter(command))
+        if name == "find":
+            filter, sort = command.get("filter") or {}, _sort_list(command.get("sort"))
+            for _ in self._select(
+                filter, sort, command.get("skip", 0), command.get("limit", 0), stats
+            ):
+                pass
+        elif name == "aggregate":
+            pipeline = command.get("pipeline") or []
+            filter, sort, _ = _pipeline_source(pipeline)
+            self._aggregate(pipeline, stats)
+        elif name in ("count", "findAndModify"):
+            filter, sort = command.get("query") or {}, []
+            for _ in self._select(filter, stats=stats):
+                pass
+        elif name in ("update", "delete"):
+            statements = command["updates" if name == "update" else "deletes"]
+            filter, sort = statements[0].get("q") or {}, []
+            for _ in self._select(filter, stats=stats):
+                pass
+        else:
+            raise OperationFailure(f"Explain of {name} is not supported", code=2)
+
+        plan = self._plan(filter, sort)
+        stage: dict[str, Any] = {"stage": "COLLSCAN", "filter": filter}
+        if plan.index is not None:
+            stage = {
+                "stage": "FETCH",
+                "filter": filter,
+                "inputStage": {
+                    "stage": "IXSCAN",
+                    "indexName": plan.index.name,
+                    "keyPattern": plan.index.document["key"],
+                    "direction": "backward" if plan.reverse else "forward",
+                },
+            }
+        if sort and not plan.ordered:
+            stage = {"stage": "SORT", "sortPattern": dict(sort), "inputStage": stage}
+        return {
+            "queryPlanner": {"namespace": self.full_name, "winningPlan": stage},
+            "executionStats": {
+                "nReturned": stats.returned,
+                "totalKeysExamined": stats.keys_examined,
+                "totalDocsExamined": stats.docs_examined,
+            },
+            "ok": 1.0,
+        }
+
+
+def _options(index: Index) -> dict[str, Any]:
+    return {
+        key: value
+        for key, value in index.document.items()
+        if key not in ("v", "key", "name", "background")
+    }
+
+
+def _pipeline_source(pipeline: list[dict]) -> tuple[dict, list, list[dict]]:
+    """
+    Split the leading $match and $sort, which read the collection through
+    an index, from the stages run on the documents.
+    """
+    stages = list(pipeline)
+    filter: dict = {}
+    sort: list = []
+    if stages and "$match" in stages[0]:
+        filter = stages.pop(0)["$match"]
+        if stages and "$sort" in stages[0]:
+            sort = _sort_list(stages.pop(0)["$sort"])
+    return filter, sort, stages
+
+
+def _unwind(spec: Union[str, dict], docs: Iterable[dict]) -> Iterator[dict]:
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    for doc in docs:
+        value = get_path(doc, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                unwound = _copy(doc)
+                _set_path(unwound, path, item)
+                yield unwound
+        elif value is _MISSING or value is None or value == []:
+            if preserve:
+                yield doc
+        else:
+            yield doc
+
+
+def _group(spec: dict, docs: Iterable[dict]) -> list[dict]:
+    accumulators = {key: value for key, value in spec.items() if key != "_id"}
+    groups: dict[tuple, dict] = {}
+    for doc in docs:
+        group_id = resolve(doc, spec["_id"])
+        group = groups.get(key := sort_key(group_id))
+        if group is None:
+            group = groups[key] = {"_id": group_id}
+            for field, accumulator in accumulators.items():
+                (op, _), *_ = accumulator.items()
+                group[field] = (
+                    [] if op == "$push" else _MISSING if op == "$first" else 0
+                )
+        for field, accumulator in accumulators.items():
+            (op, expression), *_ = accumulator.items()
+            value = resolve(doc, expression)
+            if op == "$sum":
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    group[field] += value
+            elif op == "$first":
+                if group[field] is _MISSING:
+                    group[field] = value
+            elif op == "$push":
+                group[field].append(value)
+            else:
+                raise OperationFailure(f"Unknown group operator '{op}'", code=15952)
+    return list(groups.values())
+
+
+def _bulk_result(**fields: Any) -> dict[str, Any]:
+    return {
+        "writeErrors": [],
+        "writeConcernErrors": [],
+        "nInserted": 0,
+        "nUpserted": 0,
+        "nMatched": 0,
+        "nModified": 0,
+        "nRemoved": 0,
+        "upserted": [],
+        **fields,
+    }
+
+
+def _duplicate_key(
+    collection: MemoryCollection, index: Index, doc: dict
+) -> DuplicateKeyError:
+    key_value = {path: get_path(doc, path) for path, _ in index.fields}
+    key_value = {k: (None if v is _MISSING else v) for k, v in key_value.items()}
+    message = (
+        f"E11000 duplicate key error collection: {collection.full_name} "
+        f"index: {index.name} dup key: {key_value}"
+    )
+    details = {
+        "code": 11000,
+        "errmsg": message,
+        "keyPattern": index.document["key"],
+        "keyValue": key_value,
+    }
+    return DuplicateKeyError(message, 11000, details)
@@ -0,0 +1,321 @@
+"""
+B-tree stand-in for the in-memory database: each index keeps its entries in
+a sorted list, so equality prefixes and ranges are bisected instead of
+scanned, and a sort matching the index walks it in order.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from functools import total_ordering
+from itertools import product
+from typing import Any, Iterator, Optional
+
+from pymongo import IndexModel
+
+from app.memory_mongo.query import (
+    _MISSING,
+    get_path,
+    is_operator_dict,
+    matches,
+    sort_key,
+)
+
+# Equality lookups expanded from $in lists, past this the index isn't used
+MAX_POINTS = 1000
+
+_LOW = (0,)
+_HIGH = (2,)
+
+
+@total_ordering
+class _Descending:
+    __slots__ = ("key",)
+
+    def __init__(self, key: tuple):
+        self.key = key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.key == other.key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+
+class Index:
+    def __init__(self, model: IndexModel):
+        document = model.document
+        self.name: str = document["name"]
+        self.fields: list[tuple[str, int]] = list(dict(document["key"]).items())
+        self.unique = bool(document.get("unique"))
+        self.partial: Optional[dict] = document.get("partialFilterExpression")
+        self.document = {"v": 2, **document, "key": dict(self.fields)}
+        self.entries: list[tuple] = []
+        # Set once an array is indexed, lookups by element aren't supported
+        self.multikey = False
+        # Bumped on every write, so a walk paused between batches resumes
+        # at its last entry instead of a stale position
+        self.version = 0
+
+    @classmethod
+    def primary(cls) -> "Index":
+        index = cls(IndexModel("_id", name="_id_", unique=True))
+        index.document = {"v": 2, "key": {"_id": 1}, "name": "_id_"}
+        return index
+
+    def covers(self, doc: dict) -> bool:
+        return self.partial is None or matches(doc, self.partial)
+
+    def key(self, doc: dict) -> tuple:
+        return tuple(
+            self._component(get_path(doc, path), direction)
+            for path, direction in self.fields
+        )
+
+    def add(self, doc: dict) -> None:
+        if self.covers(doc):
+            self.version += 1
+            if any(isinstance(get_path(doc, path), list) for path, _ in self.fields):
+                self.multikey = True
+            insort(self.entries, self.entry(doc))
+
+    def add_many(self, docs: list[dict]) -> None:
+        entries = [self.entry(doc) for doc in docs if self.covers(doc)]
+        self.version += 1
+        if len(entries) * 64 < len(self.entries):
+            for entry in entries:
+                insort(self.entries, entry)
+        else:
+            # Timsort merges the appended run in about linear time
+            self.entries.extend(entries)
+            self.entries.sort()
+        if not self.multikey:
+            self.multikey = any(
+                isinstance(get_path(doc, path), list)
+                for doc in docs
+                for path, _ in self.fields
+            )
+
+    def entry(self, doc: dict) -> tuple:
+        return (*self.key(doc), (1, sort_key(doc["_id"])))
+
+    def remove(self, doc: dict) -> None:
+        if self.covers(doc):
+            entry = self.entry(doc)
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+                self.version += 1
+
+    def conflicts(self, doc: dict) -> bool:
+        """
+        Whether another document already holds this unique key.
+        """
+        if not self.unique or not self.covers(doc):
+            return False
+        key = self.key(doc)
+        own_id = (1, sort_key(doc["_id"]))
+        start = bisect_left(self.entries, key)
+        end = bisect_right(self.entries, (*key, _HIGH))
+        return any(entry[-1] != own_id for entry in self.entries[start:end])
+
+    @staticmethod
+    def _component(value: Any, direction: int) -> tuple:
+        key = sort_key(value if value is not _MISSING else None)
+        return (1, key) if direction >= 0 else (1, _Descending(key))
+
+
+@dataclass
+class Plan:
+    """
+    How a query reads a collection: an index range walk or a full scan.
+    """
+
+    index: Optional[Index]
+    ranges: list[tuple[tuple, tuple]] = field(default_factory=list)
+    # Sort the walk already returns documents in, read backwards if reversed
+    ordered: bool = False
+    reverse: bool = False
+
+    def describe(self) -> str:
+        return f"IXSCAN {self.index.name}" if self.index else "COLLSCAN"
+
+
+def plan(indexes: list[Index], filter: dict, sort: list[tuple[str, int]]) -> Plan:
+    """
+    Pick the index pinning the longest key prefix, ties going to the one
+    that also returns the requested sort. No usable index means a scan.
+    """
+    best: Optional[tuple[tuple[int, bool], Plan]] = None
+    for index in indexes:
+        if index.multikey:
+            continue
+        if index.partial is not None and not _implies(filter, index.partial):
+            continue
+        candidate = _plan_index(index, filter, sort)
+        if candidate is None:
+            continue
+        prefix, candidate_plan = candidate
+        rank = (prefix, candidate_plan.ordered)
+        if best is None or rank > best[0]:
+            best = (rank, candidate_plan)
+    if best is None:
+        return Plan(index=None, ordered=not sort)
+    return best[1]
+
+
+def walk(plan: Plan) -> Iterator[tuple]:
+    """
+    Index entries of the plan's ranges, each ending with the _id key. Writes
+    between two reads are seen or not, like on a server, but never make the
+    walk skip or repeat the entries it has not changed.
+    """
+    index = plan.index
+    assert index is not None
+    ranges = reversed(plan.ranges) if plan.reverse else plan.ranges
+    for low, high in ranges:
+        last: Optional[tuple] = None
+        version = -1
+        while True:
+            if version != index.version:
+                version = index.version
+                entries = index.entries
+                start = bisect_left(entries, low)
+                end = bisect_right(entries, high)
+                if last is None:
+                    position = end - 1 if plan.reverse else start
+                elif plan.reverse:
+                    position = min(end, bisect_left(entries, last)) - 1
+                else:
+                    position = max(start, bisect_right(entries, last))
+            if not start <= position < end:
+                break
+            last = entries[position]
+            yield last
+            position += -1 if plan.reverse else 1
+
+
+def _plan_index(
+    index: Index, filter: dict, sort: list[tuple[str, int]]
+) -> Optional[tuple[int, Plan]]:
+    points: list[list[tuple]] = []
+    for path, direction in index.fields:
+        values = _point_values(filter.get(path, _MISSING))
+        if values is None:
+            break
+        points.append([Index._component(value, direction) for value in values])
+
+    prefixes = [()]
+    if points:
+        count = 1
+        for values in points:
+            count *= len(values)
+        if count > MAX_POINTS:
+            return None
+        prefixes = sorted(set(product(*points)))
+
+    rest = index.fields[len(points) :]
+    bound: Optional[tuple[tuple, tuple]] = None
+    if rest:
+        path, direction = rest[0]
+        low, high = _bounds(filter, path)
+        if low is not _MISSING or high is not _MISSING:
+            # Descending keys store larger values first
+            if direction < 0:
+                low, high = high, low
+            bound = (
+                _LOW if low is _MISSING else Index._component(low, direction),
+                _HIGH if high is _MISSING else Index._component(high, direction),
+            )
+
+    if not points and bound is None:
+        # The index only helps with the order
+        if not sort or not _follows(rest, sort)[0]:
+            return None
+
+    ranges = []
+    for prefix in prefixes:
+        if bound is None:
+            ranges.append((prefix, (*prefix, _HIGH)))
+        else:
+            ranges.append(((*prefix, bound[0]), (*prefix, bound[1], _HIGH)))
+
+    ordered, reverse = (True, False) if not sort else _follows(rest, sort)
+    # Several equality prefixes come back one after the other, not merged
+    ordered = ordered and len(ranges) == 1
+    return len(points) * 2 + (bound is not None), Plan(index, ranges, ordered, reverse)
+
+
+def _point_values(condition: Any) -> Optional[list]:
+    if condition is _MISSING:
+        return None
+    if not is_operator_dict(condition):
+        return None if isinstance(condition, (list, dict)) else [condition]
+    if set(condition) == {"$eq"}:
+        return _point_values(condition["$eq"])
+    if set(condition) == {"$in"}:
+        values = list(condition["$in"])
+        if any(isinstance(value, (list, dict)) for value in values):
+            return None
+        return values
+    return None
+
+
+def _bounds(filter: dict, path: str) -> tuple[Any, Any]:
+    """
+    Loose bounds on a field the filter ranges over, also across $or clauses
+    that all bound it. Boundary values are rechecked by the filter.
+    """
+    low: Any = _MISSING
+    high: Any = _MISSING
+    condition = filter.get(path, _MISSING)
+    if is_operator_dict(condition):
+        for op, operand in condition.items():
+            if op in ("$gt", "$gte"):
+                low = operand
+            elif op in ("$lt", "$lte"):
+                high = operand
+    elif condition is not _MISSING and not isinstance(condition, (list, dict)):
+        low = high = condition
+
+    if "$or" in filter and low is _MISSING and high is _MISSING:
+        clause_bounds = [_bounds(clause, path) for clause in filter["$or"]]
+        if all(bound[0] is not _MISSING for bound in clause_bounds):
+            low = min((bound[0] for bound in clause_bounds), key=sort_key)
+        if all(bound[1] is not _MISSING for bound in clause_bounds):
+            high = max((bound[1] for bound in clause_bounds), key=sort_key)
+    return low, high
+
+
+def _follows(
+    fields: list[tuple[str, int]], sort: list[tuple[str, int]]
+) -> tuple[bool, bool]:
+    """
+    Whether walking `fields` returns `sort`, and if so backwards or not.
+    """
+    if len(sort) > len(fields):
+        return False, False
+    pairs = list(zip(fields, sort))
+    if all(f == s and d == o for (f, d), (s, o) in pairs):
+        return True, False
+    if all(f == s and d == -o for (f, d), (s, o) in pairs):
+        return True, True
+    return False, False
+
+
+def _implies(filter: dict, partial: dict) -> bool:
+    """
+    Whether every document the filter matches is in the partial index, for
+    the equality conditions partial filters here are made of.
+    """
+    for path, expected in partial.items():
+        condition = filter.get(path, _MISSING)
+        if is_operator_dict(condition) and set(condition) == {"$eq"}:
+            condition = condition["$eq"]
+        if condition is _MISSING or is_operator_dict(condition):
+            return False
+        if sort_key(condition) != sort_key(expected):
+            return False
+    return True
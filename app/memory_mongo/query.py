@@ -0,0 +1,296 @@
+"""
+Query, update and projection semantics of the in-memory database, on plain
+documents. Only the operators the services use are supported, anything else
+raises OperationFailure like an unknown operator would on the server.
+"""
+
+import re
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Iterable, Optional
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from pymongo.errors import OperationFailure
+
+_MISSING = object()
+
+
+def sort_key(value: Any) -> tuple:
+    """
+    Total order over values, following the BSON comparison order of types.
+    Missing fields sort like null.
+    """
+    kind = type(value)
+    if kind is str:
+        return (3, value)
+    if kind is ObjectId:
+        return (7, value.binary)
+    if kind is datetime:
+        return _date_key(value)
+    if value is _MISSING or value is None:
+        return (1,)
+    if kind is bool:
+        return (8, value)
+    if isinstance(value, (int, float, Decimal)):
+        return (2, value)
+    if isinstance(value, Decimal128):
+        return (2, value.to_decimal())
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, tuple((key, sort_key(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (5, tuple(sort_key(item) for item in value))
+    if isinstance(value, bytes):
+        return (6, value)
+    if isinstance(value, ObjectId):
+        return (7, value.binary)
+    if isinstance(value, datetime):
+        return _date_key(value)
+    raise OperationFailure(f"Unsupported value type {type(value).__name__}")
+
+
+def _date_key(value: datetime) -> tuple:
+    # BSON dates are UTC milliseconds, stored ones decode naive
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (9, value.replace(microsecond=value.microsecond // 1000 * 1000))
+
+
+def get_path(doc: Any, path: str) -> Any:
+    """
+    Value at a dotted path, or _MISSING.
+    """
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and next(iter(value)).startswith("$")
+
+
+def matches(doc: dict, filter: dict) -> bool:
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, clause) for clause in condition):
+                return False
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}", code=2)
+        elif not _matches_field(get_path(doc, key), condition):
+            return False
+    return True
+
+
+def _matches_field(value: Any, condition: Any) -> bool:
+    if not is_operator_dict(condition):
+        return _equals(value, condition)
+
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = _equals(value, operand)
+        elif op == "$ne":
+            ok = not _equals(value, operand)
+        elif op == "$in":
+            ok = any(_equals(value, item) for item in operand)
+        elif op == "$nin":
+            ok = not any(_equals(value, item) for item in operand)
+        elif op in _RANGE_OPS:
+            ok = any(_compare(v, op, operand) for v in _candidates(value))
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(operand)
+        elif op == "$regex":
+            ok = _regex(value, operand, condition.get("$options", ""))
+        elif op == "$options":
+            continue
+        elif op == "$not":
+            ok = not _matches_field(value, operand)
+        else:
+            raise OperationFailure(f"unknown operator: {op}", code=2)
+        if not ok:
+            return False
+    return True
+
+
+_RANGE_OPS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _candidates(value: Any) -> Iterable[Any]:
+    # A query on an array field matches any of its elements, or the array
+    if isinstance(value, list):
+        return [*value, value]
+    return [value]
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if expected is None:
+        return value is _MISSING or value is None
+    if value is _MISSING:
+        return False
+    target = sort_key(expected)
+    return any(sort_key(v) == target for v in _candidates(value))
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    if value is _MISSING:
+        return False
+    left, right = sort_key(value), sort_key(operand)
+    # Range operators only match values of the same type bracket
+    if left[0] != right[0]:
+        return False
+    return _RANGE_OPS[op](left, right)
+
+
+def _regex(value: Any, pattern: Any, options: str) -> bool:
+    flags = 0
+    for option, flag in (("i", re.I), ("m", re.M), ("s", re.S), ("x", re.X)):
+        if option in options:
+            flags |= flag
+    if isinstance(pattern, re.Pattern):
+        pattern = pattern.pattern
+    compiled = re.compile(pattern, flags)
+    return any(
+        isinstance(v, str) and compiled.search(v) is not None
+        for v in _candidates(value)
+    )
+
+
+def equality_fields(filter: dict) -> dict[str, Any]:
+    """
+    Fields a filter pins to one value, what an upsert starts the new
+    document from.
+    """
+    fields = {}
+    for key, condition in filter.items():
+        if key.startswith("$"):
+            continue
+        if not is_operator_dict(condition):
+            fields[key] = condition
+        elif set(condition) == {"$eq"}:
+            fields[key] = condition["$eq"]
+    return fields
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False) -> bool:
+    """
+    Apply update operators to `doc` in place, returns whether it changed.
+    """
+    if not update or not all(key.startswith("$") for key in update):
+        raise OperationFailure("Update document requires atomic operators", code=9)
+
+    before = sort_key(doc)
+    for op, fields in update.items():
+        for path, operand in fields.items():
+            if op == "$set":
+                _set_path(doc, path, operand)
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set_path(doc, path, operand)
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                current = get_path(doc, path)
+                if current is _MISSING:
+                    current = 0
+                elif not isinstance(current, (int, float)):
+                    raise OperationFailure(
+                        f"Cannot apply $inc to a value of non-numeric type at {path}",
+                        code=14,
+                    )
+                _set_path(doc, path, current + operand)
+            elif op == "$push":
+                current = get_path(doc, path)
+                if current is _MISSING:
+                    current = []
+                elif not isinstance(current, list):
+                    raise OperationFailure(
+                        f"The field '{path}' must be an array", code=2
+                    )
+                items = (
+                    operand["$each"]
+                    if isinstance(operand, dict) and "$each" in operand
+                    else [operand]
+                )
+                _set_path(doc, path, [*current, *items])
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}", code=9)
+    return sort_key(doc) != before
+
+
+def _set_path(doc: dict, path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset_path(doc: dict, path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    """
+    Apply a find or $project projection: inclusions, exclusions and, in
+    aggregations, "$field" references.
+    """
+    if not projection:
+        return doc
+
+    spec = dict(projection)
+    include_id = bool(spec.pop("_id", True))
+    if all(value in (0, False) for value in spec.values()):
+        result = {key: value for key, value in doc.items() if key not in spec}
+        if not include_id:
+            result.pop("_id", None)
+        return result
+
+    result = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+    for key, value in spec.items():
+        if isinstance(value, str) and value.startswith("$"):
+            value = get_path(doc, value[1:])
+        elif value in (1, True):
+            value = get_path(doc, key)
+        else:
+            raise OperationFailure(f"Unsupported projection for {key}", code=2)
+        if value is not _MISSING:
+            _set_path(result, key, value)
+    return result
+
+
+def resolve(doc: dict, expression: Any) -> Any:
+    """
+    Value of an aggregation expression: "$field" references, documents of
+    them, or literals.
+    """
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = get_path(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        return {key: resolve(doc, value) for key, value in expression.items()}
+    return expression
+
+
+def sort_documents(docs: list[dict], sort: list[tuple[str, int]]) -> list[dict]:
+    # Stable sorts from the last key to the first handle mixed directions
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda doc: sort_key(get_path(doc, field)), reverse=direction < 0)
+    return docs
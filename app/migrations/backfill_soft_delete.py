@@ -0,0 +1,68 @@
+"""
+Normalize the soft-delete fields of existing comments, teams and team_members:
+`deleted: False` on live rows and a `time_deleted` on deleted ones. Progress
+is checkpointed, an interrupted run resumes where it stopped. The indexes the
+live-only ones replace are dropped by the index step, see RETIRED_INDEXES.
+"""
+
+from datetime import datetime, timezone
+
+from pymongo.asynchronous.database import AsyncDatabase
+
+COLLECTIONS = ("comments", "teams", "team_members")
+
+BATCH_SIZE = 1000
+
+NEEDS_BACKFILL = {
+    "$or": [
+        {"deleted": {"$nin": [True, False]}},
+        {"deleted": True, "time_deleted": None},
+    ]
+}
+
+
+async def backfill(db: AsyncDatabase, name: str) -> int:
+    collection = db[name]
+    checkpoint_id = f"backfill_soft_delete:{name}"
+    checkpoint = await db.schema_migrations.find_one({"_id": checkpoint_id})
+    if checkpoint and checkpoint.get("done"):
+        return 0
+
+    last_id = checkpoint["last_id"] if checkpoint else None
+    updated = 0
+    while True:
+        filter = dict(NEEDS_BACKFILL)
+        if last_id is not None:
+            filter["_id"] = {"$gt": last_id}
+        cursor = collection.find(filter, {"_id": 1}).sort("_id", 1).limit(BATCH_SIZE)
+        ids = [doc["_id"] async for doc in cursor]
+        if not ids:
+            break
+
+        result = await collection.update_many(
+            {"_id": {"$in": ids}, "deleted": {"$nin": [True, False]}},
+            {"$set": {"deleted": False}},
+        )
+        updated += result.modified_count
+        # Retention of rows deleted before the TTL index starts from now
+        result = await collection.update_many(
+            {"_id": {"$in": ids}, "deleted": True, "time_deleted": None},
+            {"$set": {"time_deleted": datetime.now(timezone.utc)}},
+        )
+        updated += result.modified_count
+
+        last_id = ids[-1]
+        await db.schema_migrations.update_one(
+            {"_id": checkpoint_id}, {"$set": {"last_id": last_id}}, upsert=True
+        )
+
+    await db.schema_migrations.update_one(
+        {"_id": checkpoint_id}, {"$set": {"done": True}}, upsert=True
+    )
+    return updated
+
+
+async def run(db: AsyncDatabase) -> None:
+    for name in COLLECTIONS:
+        updated = await backfill(db, name)
+        print(f"{name}: backfilled {updated} documents")
@@ -0,0 +1,14 @@
+"""
+Build the per-endpoint comment counters of comments written before they
+existed. Until then their listings fall back to counting, and the first new
+comment would start the endpoint's counter from zero.
+"""
+
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.api.comments.service import CommentService
+
+
+async def run(db: AsyncDatabase) -> None:
+    rebuilt = await CommentService.rebuild_counters(db)
+    print(f"comment_counters: rebuilt {rebuilt} counters")
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Mapping
+
+from pymongo import IndexModel
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.api.comments.service import CommentService
+from app.api.team_members.service import TeamMemberService
+from app.api.teams.service import TeamService
+from app.api.users.service import UserService
+from app.migrations import backfill_soft_delete, rebuild_comment_counters
+
+# Data migrations in the order they apply, identified by name once applied.
+# Never rename or reorder an entry that may have run somewhere
+DATA_MIGRATIONS: list[tuple[str, Callable[[AsyncDatabase], Awaitable[None]]]] = [
+    ("0001_backfill_soft_delete", backfill_soft_delete.run),
+    # Counts live comments, so after the soft delete backfill
+    ("0002_rebuild_comment_counters", rebuild_comment_counters.run),
+]
+
+# Indexes of earlier versions, dropped by the index step even though it didn't
+# create them. Dropped before the new ones are built, the unique
+# team_id_1_member_id_1 would otherwise reject re-adding a removed member
+RETIRED_INDEXES = {
+    # Replaced by the live-only partial indexes and the purge TTL index
+    "comments": [
+        # Baseline chat list index, then its keyset version
+        "team_id_1_endpoint_id_1_time_created_-1",
+        "team_id_1_endpoint_id_1_time_created_-1__id_-1",
+        "author_id_1_deleted_1",
+        # TTL on a boolean, never expired anything
+        "deleted_1",
+    ],
+    "teams": ["creator_id_1"],
+    "team_members": [
+        "team_id_1_member_id_1",
+        "member_id_1",
+        "member_id_1_time_created_1__id_1",
+    ],
+}
+
+# One process migrates at a time, the others wait for its lease. A crashed
+# holder blocks them until the lease expires
+LEASE_SECONDS = 15 * 60
+LEASE_POLL_SECONDS = 1
+
+# IndexNotFound, and IndexOptionsConflict / IndexKeySpecsConflict
+_INDEX_NOT_FOUND = 27
+_INDEX_CONFLICTS = (85, 86)
+
+# Index options the server adds or ignores, left out when comparing
+_SERVER_OPTIONS = {"v", "ns", "background"}
+
+_STATE_ID = "schema"
+
+
+def wanted_indexes() -> dict[str, list[IndexModel]]:
+    indexes: dict[str, list[IndexModel]] = {}
+    for service in (UserService, TeamService, TeamMemberService, CommentService):
+        for collection, models in service.indexes().items():
+            indexes.setdefault(collection, []).extend(models)
+    return indexes
+
+
+def index_hash(indexes: Mapping[str, list[IndexModel]]) -> str:
+    specs = {
+        collection: sorted(
+            (_spec(model.document) for model in models), key=lambda s: s["name"]
+        )
+        for collection, models in indexes.items()
+    }
+    raw = json.dumps(
+        {"indexes": specs, "retired": RETIRED_INDEXES}, sort_keys=True, default=str
+    ).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+async def schema_is_current(db: AsyncDatabase) -> bool:
+    """
+    One round trip, what workers check on startup.
+    """
+    state = await db.schema_migrations.find_one({"_id": _STATE_ID}) or {}
+    return state.get("index_hash") == index_hash(wanted_indexes()) and set(
+        state.get("applied", ())
+    ) >= {name for name, _ in DATA_MIGRATIONS}
+
+
+async def migrate(db: AsyncDatabase, data: bool = True) -> list[str]:
+    """
+    Bring the indexes, and the data unless `data` is False, up to date.
+    Returns what was done, nothing when the schema was already current.
+    """
+    wanted = wanted_indexes()
+    wanted_hash = index_hash(wanted)
+    state = await db.schema_migrations.find_one({"_id": _STATE_ID}) or {}
+    applied = list(state.get("applied", ()))
+    pending = [(name, run) for name, run in DATA_MIGRATIONS if name not in applied]
+
+    changes: list[str] = []
+    if state.get("index_hash") != wanted_hash:
+        async with _lease(db, "indexes"):
+            # Another process may have synced while we waited
+            state = await db.schema_migrations.find_one({"_id": _STATE_ID}) or {}
+            if state.get("index_hash") != wanted_hash:
+                changes += await _sync_all(db, wanted, wanted_hash, state)
+
+    if not data:
+        if pending:
+            print(f"Pending data migrations: {', '.join(name for name, _ in pending)}")
+        return changes
+
+    if not pending:
+        return changes
+    async with _lease(db, "data"):
+        state = await db.schema_migrations.find_one({"_id": _STATE_ID}) or {}
+        applied = list(state.get("applied", ()))
+        for name, run in DATA_MIGRATIONS:
+            if name in applied:
+                continue
+            await run(db)
+            await db.schema_migrations.update_one(
+                {"_id": _STATE_ID},
+                {
+                    "$push": {"applied": name},
+                    "$set": {"time_updated": datetime.now(timezone.utc)},
+                },
+                upsert=True,
+            )
+            changes.append(f"applied {name}")
+    return changes
+
+
+async def _sync_all(
+    db: AsyncDatabase,
+    wanted: dict[str, list[IndexModel]],
+    wanted_hash: str,
+    state: Mapping[str, Any],
+) -> list[str]:
+    managed = state.get("indexes", {})
+    # One createIndexes per collection, collections are built concurrently
+    results = await asyncio.gather(
+        *(
+            _sync_indexes(
+                db[name],
+                models,
+                {*managed.get(name, ()), *RETIRED_INDEXES.get(name, ())},
+            )
+            for name, models in wanted.items()
+        )
+    )
+    await db.schema_migrations.update_one(
+        {"_id": _STATE_ID},
+        {
+            "$set": {
+                "index_hash": wanted_hash,
+                "indexes": {
+                    name: [model.document["name"] for model in models]
+                    for name, models in wanted.items()
+                },
+                "time_updated": datetime.now(timezone.utc),
+            }
+        },
+        upsert=True,
+    )
+    return [change for result in results for change in result]
+
+
+@asynccontextmanager
+async def _lease(db: AsyncDatabase, step: str) -> AsyncIterator[None]:
+    """
+    Hold the `step` lease document of schema_migrations, waiting while
+    another process holds an unexpired one.
+    """
+    lease_id = f"lease:{step}"
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches a free or expired lease, the upsert fails on a held one
+            await db.schema_migrations.find_one_and_update(
+                {"_id": lease_id, "time_expires": {"$lt": now}},
+                {
+                    "$set": {
+                        "owner": owner,
+                        "time_expires": now + timedelta(seconds=LEASE_SECONDS),
+                    }
+                },
+                upsert=True,
+            )
+            break
+        except DuplicateKeyError:
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        await db.schema_migrations.delete_one({"_id": lease_id, "owner": owner})
+
+
+async def _sync_indexes(
+    collection: AsyncCollection, models: list[IndexModel], managed: set[str]
+) -> list[str]:
+    """
+    Create the missing indexes of a collection, rebuild the changed ones and
+    drop the ones we created before, or retired, and no longer want. Indexes
+    created by hand are left alone.
+    """
+    cursor = await collection.list_indexes()
+    existing = {index["name"]: _spec(index) async for index in cursor}
+    wanted = {model.document["name"]: model for model in models}
+
+    changes = []
+    for name, spec in existing.items():
+        model = wanted.get(name)
+        if model is None:
+            if name not in managed:
+                continue
+        elif spec == _spec(model.document):
+            continue
+        try:
+            await collection.drop_index(name)
+        except OperationFailure as e:
+            # Dropped by an older version running without the lease
+            if e.code != _INDEX_NOT_FOUND:
+                raise
+            continue
+        changes.append(f"{collection.name}: dropped index {name}")
+
+    missing = [
+        model
+        for name, model in wanted.items()
+        if existing.get(name) != _spec(model.document)
+    ]
+    if missing:
+        try:
+            await collection.create_indexes(missing)
+        except OperationFailure as e:
+            if e.code not in _INDEX_CONFLICTS:
+                raise
+            # Fine if someone else just built the same indexes
+            cursor = await collection.list_indexes()
+            built = {index["name"]: _spec(index) async for index in cursor}
+            if any(
+                built.get(name) != _spec(model.document)
+                for name, model in wanted.items()
+            ):
+                raise
+            return changes
+        changes += [
+            f"{collection.name}: built index {model.document['name']}"
+            for model in missing
+        ]
+    return changes
+
+
+def _spec(index: Mapping[str, Any]) -> dict[str, Any]:
+    """
+    Comparable form of an IndexModel document or a list_indexes entry.
+    """
+    spec = {key: value for key, value in index.items() if key not in _SERVER_OPTIONS}
+    spec["key"] = list(dict(index["key"]).items())
+    return spec
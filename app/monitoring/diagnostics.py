@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import json
+import logging
+from typing import Any, Callable, Optional, TypeVar
+
+from pymongo import AsyncMongoClient, monitoring
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+# Commands whose plan explain can show, and where their filter is
+_FILTERS: dict[str, Callable[[dict], Any]] = {
+    "find": lambda command: command.get("filter"),
+    "aggregate": lambda command: command.get("pipeline"),
+    "count": lambda command: command.get("query"),
+    "distinct": lambda command: command.get("query"),
+    "findAndModify": lambda command: command.get("query"),
+    "update": lambda command: [update.get("q") for update in command["updates"]],
+    "delete": lambda command: [delete.get("q") for delete in command["deletes"]],
+}
+
+# Session and routing fields of a sent command, not accepted inside explain
+_SENT_ONLY = {
+    "lsid",
+    "txnNumber",
+    "writeConcern",
+    "$db",
+    "$clusterTime",
+    "$readPreference",
+}
+
+# Shapes already explained, so a hot slow query is explained once
+_EXPLAINED_LIMIT = 1000
+
+
+class DbBudgetExceeded(RuntimeError):
+    pass
+
+
+def db_budget(round_trips: int) -> Callable[[F], F]:
+    """
+    Declare how many MongoDB round trips a route handler may take, cache
+    misses included. Going over logs a warning, or fails the request when
+    DB_BUDGET_STRICT is set (as in tests).
+    """
+
+    def decorate(handler: F) -> F:
+        setattr(handler, "__db_budget__", round_trips)
+        return handler
+
+    return decorate
+
+
+def query_shape(value: Any) -> Any:
+    """
+    The filter with its values blanked, so queries differing only in their
+    parameters log the same.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [query_shape(item) for item in value[:1]]
+    return "?"
+
+
+class _RoundTrips:
+    def __init__(self):
+        self.count = 0
+
+
+_round_trips: contextvars.ContextVar[Optional[_RoundTrips]] = contextvars.ContextVar(
+    "round_trips", default=None
+)
+
+
+class QueryDiagnostics(monitoring.CommandListener):
+    """
+    Counts the round trips of the current request and logs the commands slower
+    than SLOW_QUERY_MS with their filter shape, explaining them when
+    SLOW_QUERY_EXPLAIN is set.
+    """
+
+    def __init__(self):
+        self.client: Optional[AsyncMongoClient] = None
+        self._pending: dict[tuple[int, object], dict] = {}
+        self._explained: set[str] = set()
+
+    def attach(self, client: AsyncMongoClient) -> None:
+        """
+        Client explain runs on.
+        """
+        self.client = client
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if round_trips := _round_trips.get():
+            round_trips.count += 1
+        if settings.SLOW_QUERY_MS > 0 and event.command_name in _FILTERS:
+            self._pending[(event.request_id, event.connection_id)] = event.command
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event)
+
+    def _finish(self, event) -> None:
+        command = self._pending.pop((event.request_id, event.connection_id), None)
+        if command is None:
+            return
+
+        elapsed_ms = event.duration_micros / 1000
+        if elapsed_ms < settings.SLOW_QUERY_MS:
+            return
+
+        name = event.command_name
+        shape = json.dumps(query_shape(_FILTERS[name](command)), default=str)
+        target = f"{event.database_name}.{command.get(name)}"
+        logger.warning("Slow %s on %s, %.1f ms: %s", name, target, elapsed_ms, shape)
+
+        key = f"{target} {name} {shape}"
+        if (
+            settings.SLOW_QUERY_EXPLAIN
+            and self.client is not None
+            and key not in self._explained
+            and len(self._explained) < _EXPLAINED_LIMIT
+        ):
+            self._explained.add(key)
+            # Own context, the explain is not a round trip of the request
+            asyncio.get_running_loop().create_task(
+                self._explain(event.database_name, name, command, target),
+                context=contextvars.Context(),
+            )
+
+    async def _explain(
+        self, database: str, name: str, command: dict, target: str
+    ) -> None:
+        assert self.client is not None
+        explained = {k: v for k, v in command.items() if k not in _SENT_ONLY}
+        try:
+            plan = await self.client[database].command(
+                {"explain": explained, "verbosity": "executionStats"}
+            )
+        except Exception as e:
+            logger.warning("Could not explain %s on %s: %s", name, target, e)
+            return
+
+        problems = []
+        if _find_stage(plan, "COLLSCAN"):
+            problems.append("COLLSCAN")
+        stats = _find_key(plan, "executionStats") or {}
+        examined = stats.get("totalDocsExamined", 0)
+        returned = stats.get("nReturned", 0)
+        if examined > settings.SLOW_QUERY_DOCS_RATIO * max(returned, 1):
+            problems.append(f"docsExamined/nReturned {examined}/{returned}")
+        if problems:
+            logger.warning("Plan of %s on %s: %s", name, target, ", ".join(problems))
+
+
+class RoundTripMiddleware:
+    """
+    Count the MongoDB round trips of each request against the db_budget of
+    its route handler.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        round_trips = _RoundTrips()
+        token = _round_trips.set(round_trips)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _round_trips.reset(token)
+
+        route = scope.get("route")
+        budget = getattr(getattr(route, "endpoint", None), "__db_budget__", None)
+        if budget is None or round_trips.count <= budget:
+            return
+
+        message = (
+            f"{scope['method']} {route.path_format} took {round_trips.count} "
+            f"MongoDB round trips, its budget is {budget}"
+        )
+        if settings.DB_BUDGET_STRICT:
+            raise DbBudgetExceeded(message)
+        logger.warning(message)
+
+
+def _find_stage(plan: Any, stage: str) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(_find_stage(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_find_stage(value, stage) for value in plan)
+    return False
+
+
+def _find_key(plan: Any, key: str) -> Any:
+    if isinstance(plan, dict):
+        if key in plan:
+            return plan[key]
+        values = plan.values()
+    elif isinstance(plan, list):
+        values = plan
+    else:
+        return None
+    for value in values:
+        if (found := _find_key(value, key)) is not None:
+            return found
+    return None
+
+
+query_diagnostics = QueryDiagnostics()
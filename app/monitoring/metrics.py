@@ -0,0 +1,230 @@
+import bisect
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional, TypeVar
+
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Request latency buckets, in seconds
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Mongo command latency buckets, in seconds
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples()
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        ...
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = HTTP_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # Per label set: count per bucket (+Inf last), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, le=str(bound))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total[0]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        return "\n".join(line for m in self._metrics for line in m.expose()) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route template, handler and status.",
+        ("method", "route", "handler", "status"),
+    )
+)
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency until the last body byte, by route template.",
+        ("method", "route", "handler"),
+    )
+)
+mongo_commands = registry.register(
+    Counter(
+        "mongo_commands_total",
+        "MongoDB commands by collection, command and outcome.",
+        ("collection", "command", "outcome"),
+    )
+)
+mongo_command_duration = registry.register(
+    Histogram(
+        "mongo_command_duration_seconds",
+        "MongoDB command latency by collection and command.",
+        ("collection", "command"),
+        MONGO_BUCKETS,
+    )
+)
+component_stats = registry.register(
+    Gauge(
+        "app_component_stat",
+        "Counters of in-process caches and pools, as reported by their stats().",
+        ("component", "stat"),
+    )
+)
+
+
+class MetricsMiddleware:
+    """
+    Count and time HTTP requests under the path template of the matched route
+    and the qualified name of its handler, e.g. CommentService.get_comments.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # Set by the router once a route matched
+            route = scope.get("route")
+            template = getattr(route, "path_format", None) or "unmatched"
+            endpoint = getattr(route, "endpoint", None)
+            handler = getattr(endpoint, "__qualname__", "") if endpoint else ""
+            method = scope["method"]
+            http_requests.inc(method, template, handler, str(status))
+            http_request_duration.observe(
+                method, template, handler, value=time.perf_counter() - start
+            )
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Count and time MongoDB commands per collection.
+    """
+
+    def __init__(self):
+        # Collection of the in-flight commands, only started events carry it
+        self._collections: dict[tuple[int, object], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self._collections[(event.request_id, event.connection_id)] = _collection(
+            event.command_name, event.command
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome: str) -> None:
+        collection = self._collections.pop((event.request_id, event.connection_id), "")
+        mongo_commands.inc(collection, event.command_name, outcome)
+        mongo_command_duration.observe(
+            collection, event.command_name, value=event.duration_micros / 1e6
+        )
+
+
+def _collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    target: Optional[object] = command.get(command_name)
+    # Database level commands (ping, hello, ...) name no collection
+    return target if isinstance(target, str) else ""
+
+
+command_metrics = CommandMetrics()
@@ -0,0 +1,86 @@
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from pymongo import monitoring
+
+
+@dataclass
+class _PoolStats:
+    open: int = 0
+    checked_out: int = 0
+    wait_queue: int = 0
+    checkouts: int = 0
+    checkout_failures: int = 0
+    checkout_seconds_total: float = 0
+    checkout_seconds_max: float = 0
+    cleared: int = 0
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Connection pool usage per server, from the driver's CMAP events.
+    """
+
+    def __init__(self):
+        self._pools: dict[str, _PoolStats] = {}
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {address: asdict(pool) for address, pool in self._pools.items()}
+
+    def _pool(self, address: tuple[str, int]) -> _PoolStats:
+        key = "%s:%s" % address
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _PoolStats()
+        return pool
+
+    def _checkout_done(self, event: Any) -> _PoolStats:
+        pool = self._pool(event.address)
+        pool.wait_queue -= 1
+        pool.checkout_seconds_total += event.duration
+        pool.checkout_seconds_max = max(pool.checkout_seconds_max, event.duration)
+        return pool
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        self._pool(event.address)
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        self._pool(event.address).cleared += 1
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        self._pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self._pool(event.address).open += 1
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self._pool(event.address).open -= 1
+
+    def connection_check_out_started(
+        self, event: monitoring.ConnectionCheckOutStartedEvent
+    ) -> None:
+        self._pool(event.address).wait_queue += 1
+
+    def connection_check_out_failed(
+        self, event: monitoring.ConnectionCheckOutFailedEvent
+    ) -> None:
+        self._checkout_done(event).checkout_failures += 1
+
+    def connection_checked_out(
+        self, event: monitoring.ConnectionCheckedOutEvent
+    ) -> None:
+        pool = self._checkout_done(event)
+        pool.checkouts += 1
+        pool.checked_out += 1
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self._pool(event.address).checked_out -= 1
+
+
+pool_monitor = PoolMonitor()
@@ -0,0 +1,57 @@
+import base64
+from typing import Any, Sequence
+
+from bson import json_util
+
+from app.exceptions import InvalidParameterException
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """
+    Encode the sort key of a document into an opaque, url safe token.
+    """
+
+    raw = json_util.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(
+    token: str, types: Sequence[type], param: str = "cursor"
+) -> list[Any]:
+    """
+    Decode a token made by `encode_cursor`, checking each value has the type
+    of its sort field. Only then can the values go into a filter, a client
+    could otherwise pass operators like {"$ne": null}.
+    """
+
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json_util.loads(raw)
+    except Exception:
+        values = None
+
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(type(v) is t for v, t in zip(values, types))
+    ):
+        raise InvalidParameterException({param: ["Invalid cursor"]})
+    return values
+
+
+def keyset_filter(
+    sort: list[tuple[str, int]], values: list[Any], reverse: bool = False
+) -> dict[str, Any]:
+    """
+    Build the filter that resumes a `sort` ordered scan right after (or before
+    when `reverse`) the document whose sort key is `values`.
+    """
+
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        forward = (direction == 1) != reverse
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$gt" if forward else "$lt": values[i]}
+        clauses.append(clause)
+
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
@@ -1,7 +1,7 @@
 from enum import StrEnum
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import Query
+from fastapi import Depends, Query
 from pydantic import BaseModel, BeforeValidator, EmailStr, Field
 
 
@@ -31,9 +31,51 @@ class OrderedStrEnum(StrEnum):
         return self == other or self > other
 
 
-class _Pagination(BaseModel):
+class _CursorPagination(BaseModel):
     limit: int = Field(50, ge=1, le=100, description="Max number of items to return")
+    after: Optional[str] = Field(
+        None, description="Cursor returned as next_cursor, resumes after it"
+    )
+
+
+class _Pagination(_CursorPagination):
     skip: int = 100
+    before: Optional[str] = Field(
+        None, description="Cursor returned as prev_cursor, resumes before it"
+    )
+
+
+_Limit = Annotated[
+    int, Query(ge=1, le=100, description="Max number of items to return")
+]
+_After = Annotated[
+    Optional[str],
+    Query(description="Cursor returned as next_cursor, resumes after it"),
+]
+
+
+# Plain query parameters instead of a Query() model, which FastAPI only binds
+# when it is the route's sole query parameter (next to fields or sort it isn't)
+def _cursor_pagination(limit: _Limit = 50, after: _After = None) -> _CursorPagination:
+    return _CursorPagination(limit=limit, after=after)
+
+
+def _pagination(
+    limit: _Limit = 50,
+    after: _After = None,
+    skip: int = 100,
+    before: Annotated[
+        Optional[str],
+        Query(description="Cursor returned as prev_cursor, resumes before it"),
+    ] = None,
+) -> _Pagination:
+    return _Pagination(limit=limit, after=after, skip=skip, before=before)
+
 
+Pagination = Annotated[_Pagination, Depends(_pagination)]
+CursorPagination = Annotated[_CursorPagination, Depends(_cursor_pagination)]
 
-Pagination = Annotated[_Pagination, Query()]
+Fields = Annotated[
+    Optional[str],
+    Query(description="Comma separated fields to return, all fields when omitted"),
+]
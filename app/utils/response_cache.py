@@ -0,0 +1,173 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from app.config import settings
+from app.utils.responses import etag_matches, not_modified
+
+# Tags whose last invalidation is remembered, older ones count as just now
+MAX_INVALIDATED_TAGS = 10000
+
+
+class _Entry(NamedTuple):
+    expires: float
+    body: bytes
+    headers: dict[str, str]
+    media_type: Optional[str]
+    tags: tuple[str, ...]
+
+
+def team_tag(team_id) -> str:
+    return f"team:{team_id}"
+
+
+def endpoint_tag(team_id, endpoint_id: str) -> str:
+    return f"endpoint:{team_id}:{endpoint_id}"
+
+
+def user_tag(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def cache_key(request: Request, *extra: Hashable) -> tuple:
+    """
+    Route path and query parameters, plus whatever else the response depends
+    on (the user for per-user listings).
+    """
+    query = tuple(sorted(request.query_params.multi_items()))
+    return (request.url.path, query, *extra)
+
+
+class ResponseCache:
+    """
+    In-process LRU of serialized responses bounded by total body size.
+    Write paths invalidate entries through the tags they were stored with.
+
+    A write can invalidate a tag while a request is still reading the old
+    data, so a response is only stored if none of its tags was invalidated
+    since the request read generation(), before its first DB read.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._tags: dict[str, set[Hashable]] = {}
+        self._generation = 0
+        # Generation of the last invalidation of each tag, oldest first
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        # Newest generation no longer in _invalidated
+        self._forgotten = 0
+
+    def respond(self, request: Request, key: Hashable) -> Optional[Response]:
+        """
+        The cached response for `key`, or 304 when the client already has it.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.expires <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        etag = entry.headers.get("etag")
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
+        return Response(entry.body, headers=entry.headers, media_type=entry.media_type)
+
+    def generation(self) -> int:
+        """
+        Current invalidation generation, read before the DB reads of a
+        response and passed to store().
+        """
+        return self._generation
+
+    def store(
+        self,
+        key: Hashable,
+        response: Response,
+        tags: Iterable[str],
+        generation: int,
+    ) -> None:
+        body = bytes(response.body)
+        if self.ttl <= 0 or response.status_code != 200 or len(body) > self.max_bytes:
+            return
+        tags = set(tags)
+        if generation < self._forgotten or any(
+            self._invalidated.get(tag, 0) > generation for tag in tags
+        ):
+            # Read while a write was changing it, possibly stale already
+            return
+
+        self._remove(key)
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name not in ("content-length", "content-type")
+        }
+        entry = _Entry(
+            time.monotonic() + self.ttl,
+            body,
+            headers,
+            response.media_type,
+            tuple(tags),
+        )
+        self._entries[key] = entry
+        self.size_bytes += len(body)
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        self._generation += 1
+        for tag in tags:
+            self._invalidated[tag] = self._generation
+            self._invalidated.move_to_end(tag)
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+        while len(self._invalidated) > MAX_INVALIDATED_TAGS:
+            _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        self.size_bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL_SECONDS
+)
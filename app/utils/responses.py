@@ -0,0 +1,52 @@
+from typing import Any, Mapping, Optional
+
+from bson import ObjectId
+from fastapi import Request, Response
+from pydantic_core import to_json
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_bytes(content: Any) -> bytes:
+    return to_json(content, fallback=_encode)
+
+
+def json_response(
+    content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """
+    Serialize trusted content straight to JSON bytes, skipping response model
+    validation. Routes returning it declare their `response_model` for docs.
+    """
+    return Response(
+        json_bytes(content),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether the If-None-Match header names `etag`, compared weakly.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def validator_headers(etag: str) -> dict[str, str]:
+    # Clients may keep the body but must revalidate it on every use
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag))
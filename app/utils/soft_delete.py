@@ -0,0 +1,48 @@
+"""
+Soft-delete scheme of comments, teams and team_members. Every row carries
+`deleted: False` until it is deleted, which sets `deleted: True` and the
+`time_deleted` the purge TTL index counts from.
+"""
+
+from datetime import datetime, timezone
+from typing import Any
+
+from pymongo import IndexModel
+
+from app.config import settings
+
+# Options of indexes that only cover live rows. The planner only picks them
+# for queries matching `deleted: False` exactly, hence `live`
+LIVE_ONLY = {"partialFilterExpression": {"deleted": False}}
+
+
+def live(filter: dict[str, Any]) -> dict[str, Any]:
+    """
+    `filter` restricted to rows that are not soft-deleted.
+    """
+    return {**filter, "deleted": False}
+
+
+def soft_delete(deleted_by: Any) -> dict[str, Any]:
+    """
+    Update marking the matched rows deleted.
+    """
+    return {
+        "$set": {
+            "deleted": True,
+            "time_deleted": datetime.now(timezone.utc),
+            "deleted_by": deleted_by,
+        }
+    }
+
+
+def purge_index() -> IndexModel:
+    """
+    Removes deleted rows for good once the retention period has passed.
+    """
+    return IndexModel(
+        "time_deleted",
+        name="purge_deleted",
+        expireAfterSeconds=settings.SOFT_DELETE_RETENTION_SECONDS,
+        partialFilterExpression={"deleted": True},
+    )
@@ -0,0 +1,152 @@
+"""
+Drive the app with one of the load scenarios and report throughput and
+p50/p95/p99 latency per route as JSON.
+
+    python -m benchmarks.load comment_polling [--url URL] [--duration 30]
+        [--concurrency 20] [--comments 1000000] [--members 1000] [--out FILE]
+        [--response-cache]
+
+Without --url the app runs in-process behind httpx's ASGI transport, with
+its lifespan, against the database the settings point at. With --url the
+server must use the same database and JWT secrets, the data is seeded
+directly. DATABASE_BACKEND=memory runs the in-process mode without a
+MongoDB server. Compare two results with `python -m benchmarks.load.compare`.
+
+comment_polling and deep_pagination run with the response cache off unless
+--response-cache is given, as a server under test must
+(RESPONSE_CACHE_TTL_SECONDS=0).
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+
+import httpx
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.config import settings
+from app.database import create_client
+from benchmarks.load.runner import environment, run_load
+from app.utils.response_cache import response_cache
+from benchmarks.load.scenarios import SCENARIOS, UNCACHED
+from benchmarks.load.seed import Sizes, seed
+
+# Seeded tokens outlive the run by this much, the app's own expire sooner
+TOKEN_MARGIN = timedelta(minutes=10)
+
+
+@asynccontextmanager
+async def connect(
+    url: Optional[str],
+) -> AsyncIterator[tuple[httpx.AsyncClient, AsyncDatabase]]:
+    timeout = httpx.Timeout(30)
+    if url:
+        mongo = create_client()
+        try:
+            async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+                yield client, mongo[settings.DB_NAME]
+        finally:
+            await mongo.close()
+        return
+
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=timeout
+        ) as client:
+            yield client, app.state.database
+
+
+def cache_enabled(args: argparse.Namespace) -> bool:
+    return args.scenario not in UNCACHED or args.response_cache
+
+
+def run_settings(args: argparse.Namespace) -> dict:
+    """
+    Settings results are only comparable under, `compare` checks they match.
+    With --url they are this process's, which must be the server's.
+    """
+    ttl = settings.RESPONSE_CACHE_TTL_SECONDS
+    return {
+        "database_backend": settings.DATABASE_BACKEND,
+        "response_cache_ttl_seconds": ttl if cache_enabled(args) else 0,
+        "response_cache_max_bytes": settings.RESPONSE_CACHE_MAX_BYTES,
+        "mongodb_max_pool_size": settings.MONGODB_MAX_POOL_SIZE,
+        "mongodb_min_pool_size": settings.MONGODB_MIN_POOL_SIZE,
+        "mongodb_wait_queue_timeout_ms": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "password_hash_workers": settings.PASSWORD_HASH_WORKERS,
+        "password_hash_max_queue": settings.PASSWORD_HASH_MAX_QUEUE,
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    sizes = Sizes(
+        members=args.members,
+        endpoints=args.endpoints,
+        comments=args.comments,
+        spare_users=args.spare_users,
+    )
+    if not args.url and not cache_enabled(args):
+        response_cache.ttl = 0
+    async with connect(args.url) as (client, db):
+        data = await seed(db, sizes, timedelta(seconds=args.duration) + TOKEN_MARGIN)
+        result = await run_load(
+            client, SCENARIOS[args.scenario](data), args.concurrency, args.duration
+        )
+
+    return {
+        "scenario": args.scenario,
+        "target": args.url or "asgi",
+        "time_started": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "seed": vars(sizes),
+            "settings": run_settings(args),
+        },
+        **result,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--url", help="Base url of a running server")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--comments", type=int, default=1_000_000)
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--endpoints", type=int, default=50)
+    parser.add_argument("--spare-users", type=int, default=1000)
+    parser.add_argument("--out", help="Write the JSON result here too")
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help=f"Keep the response cache on for {', '.join(sorted(UNCACHED))}",
+    )
+    args = parser.parse_args()
+    if args.url and settings.DATABASE_BACKEND == "memory":
+        sys.exit("--url needs the server's database, not the in-memory one")
+    if args.url and not cache_enabled(args) and settings.RESPONSE_CACHE_TTL_SECONDS:
+        sys.exit(
+            f"{args.scenario} measures the queries: run the server and this "
+            "command with RESPONSE_CACHE_TTL_SECONDS=0, or pass --response-cache"
+        )
+
+    result = asyncio.run(main(args))
+    report = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    sys.stdout.write(report + "\n")
+    if result["errors"]:
+        sys.exit(f"{args.scenario} failed: {result['errors']} unexpected responses")
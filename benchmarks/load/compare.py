@@ -0,0 +1,74 @@
+"""
+Compare two load results route by route, e.g. the main branch against a
+change, and fail when a route got slower than the threshold allows.
+
+    python -m benchmarks.load.compare BASE.json HEAD.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(base: dict, head: dict, threshold: float) -> tuple[list[str], bool]:
+    lines = [
+        f"{base['environment']['commit'][:10] or '?'} -> "
+        f"{head['environment']['commit'][:10] or '?'} ({head['scenario']})"
+    ]
+    regressed = False
+    for route, after in head["routes"].items():
+        if after.get("errors"):
+            lines.append(f"  {route}: {after['errors']} unexpected responses !")
+            regressed = True
+        before = base["routes"].get(route)
+        if before is None:
+            lines.append(f"  {route}: new route")
+            continue
+        # Routes that only failed have no latencies to compare
+        if not all(metric in r for metric in METRICS for r in (before, after)):
+            continue
+
+        changes = []
+        for metric in METRICS:
+            old, new = before[metric], after[metric]
+            delta = (new - old) / old if old else 0
+            flag = ""
+            if delta > threshold:
+                flag = " !"
+                regressed = True
+            changes.append(f"{metric} {old:.1f} -> {new:.1f} ({delta:+.0%}){flag}")
+        rps = f"{before['throughput_rps']:.0f} -> {after['throughput_rps']:.0f} rps"
+        lines.append(f"  {route}: {rps}, {', '.join(changes)}")
+    return lines, regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Largest accepted latency increase, as a fraction",
+    )
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    if base["scenario"] != head["scenario"]:
+        sys.exit(f"Different scenarios: {base['scenario']} and {head['scenario']}")
+    base_settings = base["config"].get("settings")
+    head_settings = head["config"].get("settings")
+    if base_settings != head_settings:
+        sys.exit(f"Different settings: {base_settings} and {head_settings}")
+
+    lines, regressed = compare(base, head, args.threshold)
+    print("\n".join(lines))
+    sys.exit(1 if regressed else 0)
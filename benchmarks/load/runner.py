@@ -0,0 +1,142 @@
+import asyncio
+import math
+import platform
+import subprocess
+import time
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+
+# Unexpected responses kept in the report, enough to tell what went wrong
+MAX_FAILURES = 10
+
+
+class ScenarioFailure(Exception):
+    """
+    A response the scenario didn't expect, the step stops there.
+    """
+
+
+class Recorder:
+    """
+    Latency and status samples per route template.
+    """
+
+    def __init__(self):
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.statuses: defaultdict[str, Counter[int]] = defaultdict(Counter)
+        self.errors: Counter[str] = Counter()
+        self.failures: list[str] = []
+
+    async def call(
+        self, client: httpx.AsyncClient, method: str, route: str, url: str, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request, recorded under `route` (e.g. "GET /api/teams/"), not
+        its url, so every run groups the same way. Anything but a 2xx or a
+        304 is an error, not a latency sample: a fast 401 would flatter the
+        run.
+        """
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        self.statuses[route][response.status_code] += 1
+        if not (response.is_success or response.status_code == 304):
+            self.errors[route] += 1
+            failure = f"{method} {url}: {response.status_code} {response.text[:200]}"
+            if len(self.failures) < MAX_FAILURES:
+                self.failures.append(failure)
+            raise ScenarioFailure(failure)
+        self.latencies[route].append(elapsed)
+        return response
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        routes = {}
+        for route in sorted({*self.latencies, *self.errors}):
+            samples = sorted(self.latencies[route])
+            routes[route] = {
+                "requests": len(samples),
+                "errors": self.errors[route],
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "statuses": {
+                    str(code): n for code, n in sorted(self.statuses[route].items())
+                },
+            }
+            if samples:
+                routes[route].update(
+                    p50_ms=_percentile_ms(samples, 50),
+                    p95_ms=_percentile_ms(samples, 95),
+                    p99_ms=_percentile_ms(samples, 99),
+                    max_ms=round(samples[-1] * 1000, 3),
+                )
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "routes": routes,
+            "failures": self.failures,
+        }
+
+
+Step = Callable[[httpx.AsyncClient, Recorder, int], Awaitable[None]]
+
+
+async def run_load(
+    client: httpx.AsyncClient, step: Step, concurrency: int, duration: float
+) -> dict[str, Any]:
+    """
+    Run `step` in a loop on `concurrency` workers for `duration` seconds.
+    A step failing with a transport error or an unexpected response is
+    recorded and started over.
+    """
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def worker(index: int) -> None:
+        while time.perf_counter() < deadline:
+            try:
+                await step(client, recorder, index)
+            except (httpx.HTTPError, ScenarioFailure):
+                pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return recorder.report(time.perf_counter() - start)
+
+
+def environment() -> dict[str, Any]:
+    """
+    What a result is compared across: the commit and the interpreter.
+    """
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def _git(*args: str) -> str:
+    try:
+        result = subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return result.stdout.strip()
+
+
+def _percentile_ms(samples: list[float], percentile: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples, in milliseconds.
+    """
+    rank = max(math.ceil(percentile / 100 * len(samples)) - 1, 0)
+    return round(samples[rank] * 1000, 3)
@@ -0,0 +1,199 @@
+"""
+Traffic mixes modelled on how the app is used. Each scenario builds the step
+one worker repeats until the run ends.
+"""
+
+import random
+import uuid
+
+import httpx
+
+from benchmarks.load.runner import Recorder, Step
+from benchmarks.load.seed import Dataset
+
+# Share of comment polls followed by a new comment, real pages are mostly read
+POLL_WRITE_RATIO = 0.05
+
+# Emails per bulk membership edit
+MEMBERSHIP_BATCH = 50
+
+# Pages a deep pagination walk goes through before starting over
+MAX_PAGES = 200
+
+
+def _auth(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def auth_storm(data: Dataset) -> Step:
+    """
+    Register a new user and log in, then log in again as a seeded member.
+    Bound by bcrypt, shows the hash pool saturating.
+    """
+
+    async def step(client: httpx.AsyncClient, recorder: Recorder, worker: int):
+        email = f"storm-{uuid.uuid4().hex}@example.com"
+        form = {"name": "Storm user", "email": email, "password": data.password}
+        await recorder.call(
+            client, "POST", "POST /api/users/register", "/api/users/register", json=form
+        )
+        await recorder.call(
+            client,
+            "POST",
+            "POST /api/users/login",
+            "/api/users/login",
+            json={
+                "email": random.choice(data.member_emails),
+                "password": data.password,
+            },
+        )
+
+    return step
+
+
+def comment_polling(data: Dataset) -> Step:
+    """
+    Members polling the comments of hot endpoints with If-None-Match, as the
+    front end does, with an occasional new comment invalidating the page.
+    """
+    weights = [1 / (i + 1) for i in range(len(data.endpoints))]
+    etags_by_worker: dict[int, dict[str, str]] = {}
+
+    async def step(client: httpx.AsyncClient, recorder: Recorder, worker: int):
+        token = data.member_tokens[worker % len(data.member_tokens)]
+        endpoint = random.choices(data.endpoints, weights)[0]
+        url = f"/api/comments/{data.team_id}/{endpoint}"
+        etags = etags_by_worker.setdefault(worker, {})
+
+        headers = _auth(token)
+        if etag := etags.get(endpoint):
+            headers["If-None-Match"] = etag
+        response = await recorder.call(
+            client,
+            "GET",
+            "GET /api/comments/{team_id}/{endpoint_id}",
+            url,
+            params={"limit": 20, "skip": 0},
+            headers=headers,
+        )
+        if etag := response.headers.get("ETag"):
+            etags[endpoint] = etag
+
+        if random.random() < POLL_WRITE_RATIO:
+            await recorder.call(
+                client,
+                "POST",
+                "POST /api/comments/{team_id}/{endpoint_id}",
+                url,
+                json={"message": "Polling benchmark comment"},
+                headers=_auth(token),
+            )
+
+    return step
+
+
+def membership_bulk(data: Dataset) -> Step:
+    """
+    An admin adding a batch of users to the team, promoting a few, reading
+    the roster and removing the batch again.
+    """
+
+    async def step(client: httpx.AsyncClient, recorder: Recorder, worker: int):
+        # Workers edit disjoint slices of the spare users
+        start = (worker * MEMBERSHIP_BATCH) % max(len(data.spare_emails), 1)
+        emails = data.spare_emails[start : start + MEMBERSHIP_BATCH]
+        base = f"/api/teams/{data.team_id}/members"
+        headers = _auth(data.admin_token)
+
+        response = await recorder.call(
+            client,
+            "POST",
+            "POST /api/teams/{team_id}/members/batch",
+            f"{base}/batch",
+            json={"emails": emails},
+            headers=headers,
+        )
+        member_ids = [
+            result["member_id"]
+            for result in response.json().get("results", [])
+            if result.get("member_id")
+        ]
+
+        for member_id in member_ids[:5]:
+            await recorder.call(
+                client,
+                "PUT",
+                "PUT /api/teams/{team_id}/members/{member_id}",
+                f"{base}/{member_id}",
+                json={"role": "admin"},
+                headers=headers,
+            )
+        await recorder.call(
+            client,
+            "GET",
+            "GET /api/teams/{team_id}/members/",
+            f"{base}/",
+            params={"limit": 100},
+            headers=headers,
+        )
+        for member_id in member_ids:
+            await recorder.call(
+                client,
+                "DELETE",
+                "DELETE /api/teams/{team_id}/members/{member_id}",
+                f"{base}/{member_id}",
+                headers=headers,
+            )
+
+    return step
+
+
+def deep_pagination(data: Dataset) -> Step:
+    """
+    Walk the hottest endpoint with keyset cursors, next to the same depth
+    reached with skip, to keep the two paging modes comparable.
+    """
+
+    async def step(client: httpx.AsyncClient, recorder: Recorder, worker: int):
+        token = data.member_tokens[worker % len(data.member_tokens)]
+        url = f"/api/comments/{data.team_id}/{data.endpoints[0]}"
+        limit = 100
+        after = None
+        for page in range(MAX_PAGES):
+            params: dict = {"limit": limit, "skip": 0}
+            if after:
+                params["after"] = after
+            response = await recorder.call(
+                client,
+                "GET",
+                "GET /api/comments/{team_id}/{endpoint_id} (after cursor)",
+                url,
+                params=params,
+                headers=_auth(token),
+            )
+            after = response.json().get("next_cursor")
+            if not after:
+                break
+
+        await recorder.call(
+            client,
+            "GET",
+            "GET /api/comments/{team_id}/{endpoint_id} (skip)",
+            url,
+            params={"limit": limit, "skip": page * limit},
+            headers=_auth(token),
+        )
+
+    return step
+
+
+# Scenarios measuring the comment queries. Their workers repeat the same
+# URLs, so with the response cache on nearly every request would be a hit
+UNCACHED = {"comment_polling", "deep_pagination"}
+
+SCENARIOS = {
+    "auth_storm": auth_storm,
+    "comment_polling": comment_polling,
+    "membership_bulk": membership_bulk,
+    "deep_pagination": deep_pagination,
+}
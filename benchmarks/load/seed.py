@@ -0,0 +1,149 @@
+"""
+Bulk seeding straight into the database, far faster than going through the
+API. Seeded users get access tokens minted with the app's JWT settings, so a
+server under test must share them, valid for as long as the run lasts.
+"""
+
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.api.users.password_hash import hash_password
+from app.api.users.token import encode_access_token
+
+PASSWORD = "Benchmark1"
+
+INSERT_BATCH_SIZE = 10000
+
+
+@dataclass
+class Sizes:
+    members: int = 1000
+    endpoints: int = 50
+    comments: int = 1_000_000
+    # Registered users outside the team, added and removed by the scenarios
+    spare_users: int = 1000
+
+
+@dataclass
+class Dataset:
+    team_id: str
+    admin_token: str
+    member_tokens: list[str]
+    member_emails: list[str]
+    spare_emails: list[str]
+    # Hottest first, comments are skewed towards the first endpoints
+    endpoints: list[str]
+    run: str
+    password: str = PASSWORD
+
+
+async def seed(db: AsyncDatabase, sizes: Sizes, token_lifetime: timedelta) -> Dataset:
+    run = uuid.uuid4().hex[:8]
+    now = datetime.now(timezone.utc)
+    # bcrypt once, every seeded user shares the password
+    password_hash = hash_password(PASSWORD)
+
+    def user(kind: str, i: int) -> dict:
+        return {
+            "_id": ObjectId(),
+            "name": f"Bench {kind} {i}",
+            "email": f"bench-{run}-{kind}-{i}@example.com",
+            "password_hash": password_hash,
+            "time_created": now,
+            "time_updated": None,
+            "deleted": False,
+        }
+
+    members = [user("member", i) for i in range(sizes.members)]
+    spares = [user("spare", i) for i in range(sizes.spare_users)]
+    await _insert(db, "users", members + spares)
+
+    team_id = ObjectId()
+    await db.teams.insert_one(
+        {
+            "_id": team_id,
+            "name": f"Bench team {run}",
+            "creator_id": members[0]["_id"],
+            "time_created": now,
+            "time_updated": None,
+            "deleted": False,
+        }
+    )
+    await _insert(
+        db,
+        "team_members",
+        [
+            {
+                "_id": ObjectId(),
+                "team_id": team_id,
+                "member_id": member["_id"],
+                "role": "creator" if i == 0 else "member",
+                "time_created": now,
+                "time_updated": None,
+                "deleted": False,
+            }
+            for i, member in enumerate(members)
+        ],
+    )
+
+    endpoints = [f"bench-{i}" for i in range(sizes.endpoints)]
+    # Zipf-like: the first endpoints get most of the comments, like real
+    # hot pages do
+    weights = [1 / (i + 1) for i in range(sizes.endpoints)]
+    counts = dict.fromkeys(endpoints, 0)
+    start = now - timedelta(days=30)
+    for offset in range(0, sizes.comments, INSERT_BATCH_SIZE):
+        size = min(INSERT_BATCH_SIZE, sizes.comments - offset)
+        batch = []
+        for i, endpoint in enumerate(random.choices(endpoints, weights, k=size)):
+            counts[endpoint] += 1
+            batch.append(
+                {
+                    "_id": ObjectId(),
+                    "team_id": team_id,
+                    "endpoint_id": endpoint,
+                    "author_id": random.choice(members)["_id"],
+                    "message": f"Seeded comment {offset + i}",
+                    "time_created": start + timedelta(milliseconds=offset + i),
+                    "time_updated": None,
+                    "deleted": False,
+                }
+            )
+        await db.comments.insert_many(batch, ordered=False)
+
+    await _insert(
+        db,
+        "comment_counters",
+        [
+            {
+                "team_id": team_id,
+                "endpoint_id": endpoint,
+                "count": count,
+                "version": 1,
+                "time_updated": now,
+            }
+            for endpoint, count in counts.items()
+        ],
+    )
+
+    return Dataset(
+        team_id=str(team_id),
+        admin_token=encode_access_token(str(members[0]["_id"]), token_lifetime),
+        member_tokens=[
+            encode_access_token(str(m["_id"]), token_lifetime) for m in members
+        ],
+        member_emails=[m["email"] for m in members],
+        spare_emails=[s["email"] for s in spares],
+        endpoints=sorted(endpoints, key=lambda e: -counts[e]),
+        run=run,
+    )
+
+
+async def _insert(db: AsyncDatabase, collection: str, docs: list[dict]) -> None:
+    for i in range(0, len(docs), INSERT_BATCH_SIZE):
+        await db[collection].insert_many(docs[i : i + INSERT_BATCH_SIZE])
@@ -0,0 +1,77 @@
+"""
+Per-item cost of turning comment documents into response bytes.
+
+    python -m benchmarks.serialization [items]
+
+"validated" is the path list endpoints used to take: build the response
+model from raw documents, then let FastAPI validate and serialize it again.
+"trusted" is DBModel.dump_trusted + json_response.
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+for name in ("MONGODB_URL", "DB_NAME", "JWT_SECRET", "JWT_REFRESH_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+
+from app.api.comments.model import Comment, CommentCollection  # noqa: E402
+from app.utils.responses import json_response  # noqa: E402
+
+
+def make_docs(count: int) -> list[dict]:
+    team_id, author_id = ObjectId(), ObjectId()
+    start = datetime.now(timezone.utc).replace(tzinfo=None)
+    return [
+        {
+            "_id": ObjectId(),
+            "team_id": team_id,
+            "endpoint_id": "GET /api/items",
+            "author_id": author_id,
+            "message": f"Comment number {i} on this endpoint",
+            "time_created": start + timedelta(milliseconds=i),
+            "time_updated": None,
+            "deleted": False,
+        }
+        for i in range(count)
+    ]
+
+
+def validated(docs: list[dict], adapter: TypeAdapter) -> bytes:
+    content = CommentCollection(comments=docs, total=len(docs), skip=0, limit=100)
+    value = adapter.validate_python(content)
+    return adapter.dump_json(value, by_alias=True)
+
+
+def trusted(docs: list[dict]) -> bytes:
+    content = {
+        "comments": [Comment.dump_trusted(doc) for doc in docs],
+        "total": len(docs),
+        "skip": 0,
+        "limit": 100,
+        "next_cursor": None,
+        "prev_cursor": None,
+    }
+    return json_response(content).body
+
+
+def main() -> None:
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    docs = make_docs(items)
+    adapter = TypeAdapter(CommentCollection)
+
+    for label, run in (
+        ("validated", lambda: validated(docs, adapter)),
+        ("trusted", lambda: trusted(docs)),
+    ):
+        number, total = timeit.Timer(run).autorange()
+        best = min(timeit.repeat(run, number=number, repeat=5))
+        print(f"{label:>10}: {best / number / items * 1e6:8.2f} µs/item")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,15 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from app.api import api_router
+from app.api.health.router import router as health_router
+from app.api.metrics.router import router as metrics_router
 from app import database
-from app.api.comments.service import CommentService
-from app.api.team_members.service import TeamMemberService
-from app.api.teams.service import TeamService
-from app.api.users.service import UserService
+from app.api.comments.events import InMemoryCommentBroker
+from app.config import settings
 from app.exceptions import register_exceptions
+from app.migrations.runner import migrate
+from app.monitoring.diagnostics import RoundTripMiddleware
+from app.monitoring.metrics import MetricsMiddleware
 
 
 @asynccontextmanager
@@ -15,11 +18,12 @@ async def db_lifespan(app: FastAPI):
     # Startup
     db = await database.open_connection(app)
 
-    # Create database indexes
-    await UserService.create_indexes(db)
-    await TeamService.create_indexes(db)
-    await TeamMemberService.create_indexes(db)
-    await CommentService.create_indexes(db)
+    # Build the indexes unless `python -m app.commands.migrate` already did,
+    # data migrations are left to the command
+    for change in await migrate(db, data=False):
+        print(change)
+
+    app.state.comment_broker = InMemoryCommentBroker(settings.COMMENT_FEED_QUEUE_SIZE)
 
     yield
 
@@ -30,6 +34,12 @@ async def db_lifespan(app: FastAPI):
 app = FastAPI(title="Spaghetti Backend", lifespan=db_lifespan)
 
 app.include_router(api_router)
+# Probes stay outside /api, where load balancers expect them
+app.include_router(health_router)
+app.include_router(metrics_router)
+
+app.add_middleware(RoundTripMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 register_exceptions(app)
 
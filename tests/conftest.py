@@ -0,0 +1,66 @@
+import os
+
+# Settings are read on import, the tests run on the in-memory backend
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("JWT_SECRET", "test-access-secret-of-at-least-32-bytes")
+os.environ.setdefault("JWT_REFRESH_SECRET", "test-refresh-secret-of-at-least-32-bytes")
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ["DB_BUDGET_STRICT"] = "1"
+
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.database import create_client
+from app.memory_mongo.client import MemoryMongoClient
+
+PASSWORD = "Secret123"
+
+
+@pytest.fixture
+def db():
+    return MemoryMongoClient()["test"]
+
+
+@pytest.fixture
+def api():
+    """
+    Run `scenario(client)` against the app, started with its lifespan on an
+    emptied database.
+    """
+    from main import app
+
+    def run(scenario):
+        async def main():
+            await create_client().drop_database(settings.DB_NAME)
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://test"
+                ) as client:
+                    return await scenario(client)
+
+        return asyncio.run(main())
+
+    return run
+
+
+async def register(client: httpx.AsyncClient, name: str = "Ann") -> dict:
+    """
+    Register a new user, returns the user and token of the response.
+    """
+    email = f"{name.lower()}-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post(
+        "/api/users/register",
+        json={"name": name, "email": email, "password": PASSWORD},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def bearer(user: dict) -> dict[str, str]:
+    return {"Authorization": f"Bearer {user['token']['access_token']}"}
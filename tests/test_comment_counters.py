@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app.api.comments.service import CommentService
+from app.config import settings
+from app.database import create_client
+from app.migrations.runner import migrate
+from conftest import bearer, register
+
+
+async def comment_team(client) -> tuple[dict, str]:
+    user = await register(client)
+    headers = bearer(user)
+    team = await client.post("/api/teams/", json={"name": "Team"}, headers=headers)
+    return headers, team.json()["id"]
+
+
+async def total(client, headers, url) -> int:
+    response = await client.get(url, params={"skip": 0}, headers=headers)
+    return response.json()["total"]
+
+
+def test_counter_follows_writes(api):
+    async def scenario(client):
+        headers, team_id = await comment_team(client)
+        url = f"/api/comments/{team_id}/page"
+        ids = []
+        for i in range(3):
+            response = await client.post(
+                url, json={"message": f"m{i}"}, headers=headers
+            )
+            ids.append(response.json()["id"])
+        totals = [await total(client, headers, url)]
+
+        await client.delete(f"/api/comments/{ids[0]}", headers=headers)
+        # Deleting twice must not count twice
+        await client.delete(f"/api/comments/{ids[0]}", headers=headers)
+        totals.append(await total(client, headers, url))
+
+        await client.delete(f"/api/comments/endpoint/{team_id}/page", headers=headers)
+        totals.append(await total(client, headers, url))
+        return totals
+
+    assert api(scenario) == [3, 2, 0]
+
+
+def test_rebuild_counters_repairs_drift(api):
+    async def scenario(client):
+        headers, team_id = await comment_team(client)
+        for endpoint, count in (("a", 2), ("b", 1)):
+            for i in range(count):
+                await client.post(
+                    f"/api/comments/{team_id}/{endpoint}",
+                    json={"message": f"m{i}"},
+                    headers=headers,
+                )
+
+        db = create_client()[settings.DB_NAME]
+        await db.comment_counters.update_many({}, {"$set": {"count": 42}})
+        rebuilt = await CommentService.rebuild_counters(db)
+        totals = [
+            await total(client, headers, f"/api/comments/{team_id}/{endpoint}")
+            for endpoint in ("a", "b")
+        ]
+        return rebuilt, totals
+
+    assert api(scenario) == (2, [2, 1])
+
+
+def test_comments_from_before_the_counters(api):
+    async def scenario(client):
+        headers, team_id = await comment_team(client)
+        url = f"/api/comments/{team_id}/old"
+        db = create_client()[settings.DB_NAME]
+        # Written like the baseline did, without a counter
+        await db.comments.insert_many(
+            [
+                {
+                    "_id": ObjectId(),
+                    "team_id": ObjectId(team_id),
+                    "endpoint_id": "old",
+                    "author_id": ObjectId(),
+                    "message": f"m{i}",
+                    "time_created": datetime.now(timezone.utc),
+                    "time_updated": None,
+                    "deleted": False,
+                }
+                for i in range(5)
+            ]
+        )
+        before = await client.get(url, params={"skip": 0}, headers=headers)
+
+        await migrate(db)
+        await client.post(url, json={"message": "new"}, headers=headers)
+        return before, await total(client, headers, url)
+
+    before, after = api(scenario)
+    assert before.json()["total"] == 5
+    # Nothing to revalidate against until the counter exists
+    assert "ETag" not in before.headers
+    assert after == 6
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.exceptions import InvalidParameterException
+from app.utils.cursor import decode_cursor, encode_cursor, keyset_filter
+from conftest import bearer, register
+
+TYPES = [datetime, ObjectId]
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 5, 1, 12, 30, 0, 123000), ObjectId()]
+    assert decode_cursor(encode_cursor(values), TYPES) == values
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [{"$ne": None}, ObjectId()],
+        [datetime(2024, 1, 1), {"$gt": ""}],
+        ["2024-01-01", ObjectId()],
+        [datetime(2024, 1, 1)],
+    ],
+)
+def test_cursor_rejects_wrong_values(values):
+    with pytest.raises(InvalidParameterException) as info:
+        decode_cursor(encode_cursor(values), TYPES, "after")
+    assert info.value.field_errors == {"after": ["Invalid cursor"]}
+
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(InvalidParameterException):
+        decode_cursor("not a cursor", TYPES)
+
+
+def test_keyset_filter():
+    assert keyset_filter([("time", 1), ("_id", 1)], [1, 2], reverse=True) == {
+        "$or": [{"time": {"$lt": 1}}, {"time": 1, "_id": {"$lt": 2}}]
+    }
+
+
+def test_comment_pages_follow_cursors(api):
+    async def scenario(client):
+        user = await register(client)
+        headers = bearer(user)
+        team = await client.post("/api/teams/", json={"name": "Team"}, headers=headers)
+        url = f"/api/comments/{team.json()['id']}/page"
+        for i in range(7):
+            await client.post(url, json={"message": f"m{i}"}, headers=headers)
+
+        forward, params = [], {"limit": 3, "skip": 0}
+        while True:
+            page = (await client.get(url, params=params, headers=headers)).json()
+            forward += [comment["message"] for comment in page["comments"]]
+            if not page["next_cursor"]:
+                break
+            params = {"limit": 3, "skip": 0, "after": page["next_cursor"]}
+
+        backward, params = [], {"limit": 3, "before": page["prev_cursor"]}
+        while True:
+            page = (await client.get(url, params=params, headers=headers)).json()
+            backward = [comment["message"] for comment in page["comments"]] + backward
+            if not page["prev_cursor"]:
+                break
+            params = {"limit": 3, "before": page["prev_cursor"]}
+
+        invalid = await client.get(
+            url,
+            params={"after": encode_cursor([{"$ne": None}, {"$ne": None}])},
+            headers=headers,
+        )
+        return forward, backward, invalid
+
+    forward, backward, invalid = api(scenario)
+    assert forward == [f"m{i}" for i in range(7)]
+    assert backward == [f"m{i}" for i in range(6)]
+    assert invalid.status_code == 400
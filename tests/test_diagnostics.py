@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.config import settings
+from app.memory_mongo.client import MemoryMongoClient
+from app.monitoring.diagnostics import (
+    DbBudgetExceeded,
+    QueryDiagnostics,
+    RoundTripMiddleware,
+    db_budget,
+    query_diagnostics,
+)
+
+
+def budget_app() -> FastAPI:
+    db = MemoryMongoClient(event_listeners=[query_diagnostics])["test"]
+    app = FastAPI()
+    app.add_middleware(RoundTripMiddleware)
+
+    @app.get("/within")
+    @db_budget(1)
+    async def within():
+        await db.command("ping")
+
+    @app.get("/over")
+    @db_budget(1)
+    async def over():
+        await db.command("ping")
+        await db.command("ping")
+
+    return app
+
+
+def test_db_budget_fails_requests_over_it():
+    assert settings.DB_BUDGET_STRICT
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=budget_app())
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            within = await client.get("/within")
+            with pytest.raises(DbBudgetExceeded, match="took 2 MongoDB round trips"):
+                await client.get("/over")
+            return within
+
+    assert asyncio.run(scenario()).status_code == 200
+
+
+def test_slow_query_plan_is_explained(monkeypatch, caplog):
+    # Any query is slower than a microsecond
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0.001)
+    monkeypatch.setattr(settings, "SLOW_QUERY_EXPLAIN", True)
+    diagnostics = QueryDiagnostics()
+    client = MemoryMongoClient(event_listeners=[diagnostics])
+    diagnostics.attach(client)
+    db = client["test"]
+
+    async def scenario():
+        await db.comments.insert_many([{"message": f"m{i}"} for i in range(100)])
+        await db.comments.find_one({"message": "m99"})
+        # Let the explain task finish
+        await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()})
+
+    with caplog.at_level(logging.WARNING, logger="app.monitoring.diagnostics"):
+        asyncio.run(scenario())
+    assert "Slow find on test.comments" in caplog.text
+    assert "Plan of find on test.comments: COLLSCAN" in caplog.text
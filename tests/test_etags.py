@@ -0,0 +1,71 @@
+from conftest import bearer, register
+
+
+def test_comment_listing_revalidates(api):
+    async def scenario(client):
+        user = await register(client)
+        headers = bearer(user)
+        team = await client.post("/api/teams/", json={"name": "Team"}, headers=headers)
+        url = f"/api/comments/{team.json()['id']}/page"
+        await client.post(url, json={"message": "first"}, headers=headers)
+
+        first = await client.get(url, headers=headers)
+        etag = first.headers["ETag"]
+        unchanged = await client.get(url, headers={**headers, "If-None-Match": etag})
+        await client.post(url, json={"message": "second"}, headers=headers)
+        changed = await client.get(url, headers={**headers, "If-None-Match": etag})
+        return first, unchanged, changed
+
+    first, unchanged, changed = api(scenario)
+    assert first.status_code == 200
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == first.headers["ETag"]
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_roster_revalidates(api):
+    async def scenario(client):
+        owner, member = await register(client), await register(client, "Bob")
+        headers = bearer(owner)
+        team = await client.post("/api/teams/", json={"name": "Team"}, headers=headers)
+        url = f"/api/teams/{team.json()['id']}/members/"
+
+        etag = (await client.get(url, headers=headers)).headers["ETag"]
+        unchanged = await client.get(url, headers={**headers, "If-None-Match": etag})
+        await client.post(
+            f"{url}batch", json={"emails": [member["user"]["email"]]}, headers=headers
+        )
+        changed = await client.get(url, headers={**headers, "If-None-Match": etag})
+        return unchanged, changed
+
+    unchanged, changed = api(scenario)
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert len(changed.json()["members"]) == 2
+
+
+def test_invalid_parameters_are_not_revalidated(api):
+    async def scenario(client):
+        user = await register(client)
+        headers = bearer(user)
+        team = await client.post("/api/teams/", json={"name": "Team"}, headers=headers)
+        team_id = team.json()["id"]
+        await client.post(
+            f"/api/comments/{team_id}/page", json={"message": "m"}, headers=headers
+        )
+        responses = []
+        for url, params in (
+            (f"/api/comments/{team_id}/page", {"fields": "nope"}),
+            (f"/api/teams/{team_id}/members/", {"after": "nope"}),
+        ):
+            etag = (await client.get(url, headers=headers)).headers["ETag"]
+            responses.append(
+                await client.get(
+                    url, params=params, headers={**headers, "If-None-Match": etag}
+                )
+            )
+        return responses
+
+    assert [response.status_code for response in api(scenario)] == [400, 400]
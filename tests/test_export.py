@@ -0,0 +1,81 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from app.api.comments.service import CommentService
+from app.utils.soft_delete import live
+from conftest import bearer, register
+
+
+def lines(response) -> list[dict]:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_since_has_changes_and_tombstones(api):
+    async def scenario(client):
+        user = await register(client)
+        headers = bearer(user)
+        team = await client.post("/api/teams/", json={"name": "Team"}, headers=headers)
+        team_id = team.json()["id"]
+        ids = []
+        for endpoint in ("a", "b", "b"):
+            response = await client.post(
+                f"/api/comments/{team_id}/{endpoint}",
+                json={"message": endpoint},
+                headers=headers,
+            )
+            ids.append(response.json()["id"])
+
+        since = datetime.now(timezone.utc).isoformat()
+        await client.put(
+            f"/api/comments/{ids[0]}", json={"message": "edited"}, headers=headers
+        )
+        await client.delete(f"/api/comments/{ids[1]}", headers=headers)
+        created = await client.post(
+            f"/api/comments/{team_id}/c", json={"message": "c"}, headers=headers
+        )
+
+        url = f"/api/comments/team/{team_id}/export"
+        full = await client.get(url, headers=headers)
+        changes = await client.get(url, params={"since": since}, headers=headers)
+        return ids, created.json()["id"], lines(full), lines(changes)
+
+    ids, created, full, changes = api(scenario)
+    assert sorted(row["id"] for row in full) == sorted([ids[0], ids[2], created])
+    assert [row["id"] for row in changes] == [created, ids[0], ids[1]]
+    assert changes[1]["message"] == "edited"
+    assert changes[2] == {"id": ids[1], "deleted": True}
+
+
+def test_export_since_queries_are_indexed(db):
+    async def scenario():
+        await db.comments.create_indexes(CommentService.indexes()["comments"])
+        since = datetime.now(timezone.utc)
+        plans = []
+        for filter in (
+            live(
+                {
+                    "team_id": 1,
+                    "endpoint_id": {"$in": ["a"]},
+                    "time_created": {"$gt": since},
+                }
+            ),
+            live(
+                {
+                    "team_id": 1,
+                    "time_updated": {"$gt": since},
+                    "time_created": {"$lte": since},
+                }
+            ),
+            {"team_id": 1, "deleted": True, "time_deleted": {"$gt": since}},
+        ):
+            result = await db.command("explain", {"find": "comments", "filter": filter})
+            plan = result["queryPlanner"]["winningPlan"]
+            plans.append(plan.get("inputStage", {}).get("indexName"))
+        return plans
+
+    assert asyncio.run(scenario()) == [
+        "live_chat_list",
+        "live_team_updates",
+        "purge_deleted",
+    ]
@@ -0,0 +1,67 @@
+import pytest
+
+from app.api.users.service import user_cache
+from conftest import bearer, register
+
+
+async def team_with(client, owner) -> str:
+    team = await client.post(
+        "/api/teams/", json={"name": "Team"}, headers=bearer(owner)
+    )
+    return team.json()["id"]
+
+
+# Cold runs resolve the user and membership in the combined lookup
+@pytest.mark.parametrize("cold", [False, True])
+def test_removed_member_loses_access(api, cold):
+    async def scenario(client):
+        owner, member = await register(client), await register(client, "Bob")
+        team_id = await team_with(client, owner)
+        url = f"/api/teams/{team_id}/members/"
+        email = member["user"]["email"]
+
+        async def member_get() -> int:
+            if cold:
+                user_cache.clear()
+            response = await client.get(url, headers=bearer(member))
+            return response.status_code
+
+        statuses = [await member_get()]
+        await client.post(url, json=email, headers=bearer(owner))
+        statuses.append(await member_get())
+        await client.delete(f"{url}{member['user']['id']}", headers=bearer(owner))
+        statuses.append(await member_get())
+        await client.post(url, json=email, headers=bearer(owner))
+        statuses.append(await member_get())
+        return statuses
+
+    # All within the membership TTLs, negative ones included
+    assert api(scenario) == [403, 200, 403, 200]
+
+
+def test_downgraded_admin_loses_admin_routes(api):
+    async def scenario(client):
+        owner, member = await register(client), await register(client, "Bob")
+        team_id = await team_with(client, owner)
+        members = f"/api/teams/{team_id}/members/"
+        await client.post(members, json=member["user"]["email"], headers=bearer(owner))
+
+        async def rename() -> int:
+            response = await client.put(
+                f"/api/teams/{team_id}",
+                json={"name": "Renamed"},
+                headers=bearer(member),
+            )
+            return response.status_code
+
+        statuses = []
+        for role in ("admin", "member"):
+            await client.put(
+                f"{members}{member['user']['id']}",
+                json={"role": role},
+                headers=bearer(owner),
+            )
+            statuses.append(await rename())
+        return statuses
+
+    assert api(scenario) == [200, 403]
@@ -0,0 +1,216 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import IndexModel, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.memory_mongo.client import MemoryMongoClient
+from app.memory_mongo.query import matches, sort_key
+
+
+class CommandLog(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def explain(db, collection, filter, sort=None):
+    command = {"find": collection, "filter": filter}
+    if sort:
+        command["sort"] = sort
+    return asyncio.run(db.command("explain", command))
+
+
+def test_matches_operators():
+    doc = {"a": 5, "b": {"c": "x"}, "tags": ["red", "blue"], "n": None}
+    assert matches(doc, {"a": {"$gte": 5, "$lt": 6}})
+    assert matches(doc, {"b.c": "x", "tags": "blue"})
+    assert matches(doc, {"missing": None, "n": None})
+    assert matches(doc, {"$or": [{"a": 1}, {"a": {"$in": [4, 5]}}]})
+    assert not matches(doc, {"a": {"$gt": "4"}})
+    assert not matches(doc, {"missing": {"$exists": True}})
+    with pytest.raises(OperationFailure):
+        matches(doc, {"a": {"$where": "1"}})
+
+
+def test_sort_key_follows_bson_order():
+    values = [datetime(2024, 1, 1), ObjectId(), "a", 1, None, True]
+    ordered = sorted(values, key=sort_key)
+    assert [type(v) for v in ordered] == [
+        type(None),
+        int,
+        str,
+        ObjectId,
+        bool,
+        datetime,
+    ]
+
+
+def test_update_and_projection(db):
+    async def scenario():
+        result = await db.items.update_one(
+            {"name": "a"}, {"$inc": {"n": 2}, "$push": {"log": 1}}, upsert=True
+        )
+        await db.items.update_one({"name": "a"}, {"$inc": {"n": 3}})
+        return result, await db.items.find_one({"name": "a"}, {"_id": 0})
+
+    result, doc = asyncio.run(scenario())
+    assert result.upserted_id is not None
+    assert doc == {"name": "a", "n": 5, "log": [1]}
+
+
+def test_unique_index_rejects_duplicates(db):
+    async def scenario():
+        await db.users.create_index("email", unique=True)
+        await db.users.insert_one({"email": "a@example.com"})
+        await db.users.insert_one({"email": "a@example.com"})
+
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(scenario())
+
+
+def test_plan_uses_equality_prefix_and_range(db):
+    start = datetime(2024, 1, 1)
+    docs = [
+        {"team": i % 3, "time": start + timedelta(minutes=i), "deleted": False}
+        for i in range(30)
+    ]
+
+    async def scenario():
+        await db.comments.insert_many(docs)
+        await db.comments.create_indexes(
+            [IndexModel([("team", 1), ("time", -1)], name="team_time")]
+        )
+
+    asyncio.run(scenario())
+    result = explain(
+        db,
+        "comments",
+        {"team": 1, "time": {"$gt": start + timedelta(minutes=20)}},
+        {"time": -1},
+    )
+    stage = result["queryPlanner"]["winningPlan"]
+    assert stage["stage"] == "FETCH"
+    assert stage["inputStage"]["indexName"] == "team_time"
+    # Minutes 22, 25 and 28, read in index order without a sort stage
+    assert result["executionStats"]["nReturned"] == 3
+    assert result["executionStats"]["totalKeysExamined"] == 3
+
+
+def test_partial_index_only_serves_implied_filters(db):
+    async def scenario():
+        await db.comments.insert_many(
+            [{"team": 1, "deleted": i % 2 == 0} for i in range(10)]
+        )
+        await db.comments.create_indexes(
+            [
+                IndexModel(
+                    "team",
+                    name="live_team",
+                    partialFilterExpression={"deleted": False},
+                )
+            ]
+        )
+        live = await db.comments.count_documents({"team": 1, "deleted": False})
+        every = await db.comments.count_documents({"team": 1})
+        return live, every
+
+    assert asyncio.run(scenario()) == (5, 10)
+    live = explain(db, "comments", {"team": 1, "deleted": False})
+    every = explain(db, "comments", {"team": 1})
+    assert live["queryPlanner"]["winningPlan"]["inputStage"]["indexName"] == "live_team"
+    assert every["queryPlanner"]["winningPlan"]["stage"] == "COLLSCAN"
+
+
+def test_create_indexes_conflicts(db):
+    async def create(*args, **kwargs):
+        await db.items.create_indexes([IndexModel(*args, **kwargs)])
+
+    asyncio.run(create("a", name="a_idx"))
+    # Same spec again is a no-op
+    asyncio.run(create("a", name="a_idx"))
+    for args, kwargs, code in [
+        (("b",), {"name": "a_idx"}, 86),
+        (("a",), {"name": "a_idx", "unique": True}, 85),
+        (("a",), {"name": "other"}, 85),
+    ]:
+        with pytest.raises(OperationFailure) as info:
+            asyncio.run(create(*args, **kwargs))
+        assert info.value.code == code
+    # A different partial filter is a different index
+    asyncio.run(create("a", name="a_live", partialFilterExpression={"deleted": False}))
+
+
+def test_drop_missing_index_fails(db):
+    with pytest.raises(OperationFailure) as info:
+        asyncio.run(db.items.drop_index("nope"))
+    assert info.value.code == 27
+
+
+def test_cursor_reads_in_batches():
+    log = CommandLog()
+    db = MemoryMongoClient(event_listeners=[log])["test"]
+
+    async def scenario():
+        await db.items.insert_many([{"n": i} for i in range(250)])
+        log.commands.clear()
+        cursor = db.items.find({}, batch_size=100).sort("n", 1)
+        seen = []
+        async for doc in cursor:
+            seen.append(doc["n"])
+            # Only the current batch is held
+            assert len(cursor._batch) < 100
+        return seen
+
+    assert asyncio.run(scenario()) == list(range(250))
+    assert log.commands == ["find", "getMore", "getMore"]
+
+
+def test_cursor_survives_writes_between_batches(db):
+    async def scenario():
+        await db.items.create_index("n")
+        await db.items.insert_many([{"n": i} for i in range(10)])
+        cursor = db.items.find({"n": {"$gte": 0}}, batch_size=3).sort("n", 1)
+        seen = [(await cursor.next())["n"] for _ in range(3)]
+        # Shifts the entries before the cursor and removes some after it
+        await db.items.delete_many({"n": {"$in": [0, 1, 6, 7]}})
+        await db.items.insert_one({"n": 100})
+        return seen + [doc["n"] async for doc in cursor]
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4, 5, 8, 9, 100]
+
+
+def test_aggregate_lookup_and_group(db):
+    async def scenario():
+        teams = await db.teams.insert_many([{"name": "a"}, {"name": "b"}])
+        await db.members.insert_many(
+            [{"team_id": teams.inserted_ids[i % 2], "role": "m"} for i in range(5)]
+        )
+        cursor = await db.members.aggregate(
+            [
+                {
+                    "$lookup": {
+                        "from": "teams",
+                        "localField": "team_id",
+                        "foreignField": "_id",
+                        "as": "team",
+                    }
+                },
+                {"$unwind": "$team"},
+                {"$group": {"_id": "$team.name", "n": {"$sum": 1}}},
+                {"$sort": {"_id": 1}},
+            ]
+        )
+        return await cursor.to_list()
+
+    assert asyncio.run(scenario()) == [{"_id": "a", "n": 3}, {"_id": "b", "n": 2}]
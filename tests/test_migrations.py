@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pymongo import IndexModel
+
+from app.migrations import runner
+from app.migrations.runner import migrate, schema_is_current
+
+
+async def index_names(collection) -> set[str]:
+    cursor = await collection.list_indexes()
+    return {index["name"] async for index in cursor}
+
+
+def test_migrate_is_idempotent(db):
+    async def scenario():
+        first = await migrate(db)
+        second = await migrate(db)
+        return first, second, await schema_is_current(db)
+
+    first, second, current = asyncio.run(scenario())
+    assert "applied 0001_backfill_soft_delete" in first
+    assert second == []
+    assert current
+
+
+def test_migrate_drops_retired_indexes_only(db):
+    async def scenario():
+        # What the baseline created, plus one made by hand
+        await db.comments.create_indexes(
+            [
+                IndexModel([("team_id", 1), ("endpoint_id", 1), ("time_created", -1)]),
+                IndexModel("message", name="by_hand"),
+            ]
+        )
+        await db.team_members.create_indexes(
+            [
+                IndexModel([("team_id", 1), ("member_id", 1)], unique=True),
+                IndexModel("member_id"),
+            ]
+        )
+        await migrate(db, data=False)
+        return await index_names(db.comments), await index_names(db.team_members)
+
+    comments, team_members = asyncio.run(scenario())
+    assert "team_id_1_endpoint_id_1_time_created_-1" not in comments
+    assert {"live_chat_list", "by_hand"} <= comments
+    assert not {"team_id_1_member_id_1", "member_id_1"} & team_members
+    assert "live_team_member" in team_members
+
+
+def test_concurrent_migrations_take_turns(db, monkeypatch):
+    monkeypatch.setattr(runner, "LEASE_POLL_SECONDS", 0.01)
+
+    async def scenario():
+        results = await asyncio.gather(*(migrate(db, data=False) for _ in range(3)))
+        leases = await db.schema_migrations.count_documents(
+            {"_id": {"$in": ["lease:indexes", "lease:data"]}}
+        )
+        return results, leases
+
+    results, leases = asyncio.run(scenario())
+    assert sorted(bool(changes) for changes in results) == [False, False, True]
+    assert leases == 0
+
+
+def test_expired_lease_is_taken_over(db):
+    async def scenario():
+        # Left behind by a process that died while migrating
+        await db.schema_migrations.insert_one(
+            {
+                "_id": "lease:indexes",
+                "owner": "crashed",
+                "time_expires": datetime.now(timezone.utc) - timedelta(minutes=1),
+            }
+        )
+        return await migrate(db, data=False)
+
+    assert asyncio.run(scenario())
@@ -0,0 +1,52 @@
+import asyncio
+
+from conftest import PASSWORD, bearer, register
+
+
+def test_refresh_token_rotation(api):
+    async def scenario(client):
+        user = await register(client)
+        first = user["token"]["refresh_token"]
+
+        rotated = await client.post("/api/users/refresh", json=first)
+        reused = await client.post("/api/users/refresh", json=first)
+        second = rotated.json()["refresh_token"]
+        again = await client.post("/api/users/refresh", json=second)
+        return rotated, reused, again
+
+    rotated, reused, again = api(scenario)
+    assert rotated.status_code == 200
+    # The rotated token stops working as soon as it was used once
+    assert reused.status_code == 401
+    assert again.status_code == 200
+
+
+def test_concurrent_refresh_rotates_once(api):
+    async def scenario(client):
+        user = await register(client)
+        token = user["token"]["refresh_token"]
+        return await asyncio.gather(
+            *(client.post("/api/users/refresh", json=token) for _ in range(5))
+        )
+
+    statuses = sorted(response.status_code for response in api(scenario))
+    assert statuses == [200, 401, 401, 401, 401]
+
+
+def test_logout_all_revokes_every_session(api):
+    async def scenario(client):
+        user = await register(client, "Bob")
+        login = await client.post(
+            "/api/users/login",
+            json={"email": user["user"]["email"], "password": PASSWORD},
+        )
+        logout = await client.post("/api/users/logout-all", headers=bearer(user))
+        refreshes = [
+            await client.post("/api/users/refresh", json=token["refresh_token"])
+            for token in (user["token"], login.json()["token"])
+        ]
+        return logout, refreshes
+
+    logout, refreshes = api(scenario)
+    assert logout.json()["sessions"] == 2
+    assert [response.status_code for response in refreshes] == [401, 401]
@@ -0,0 +1,37 @@
+from fastapi import Response
+
+from app.utils import response_cache as module
+from app.utils.response_cache import ResponseCache
+
+
+def page(body: bytes = b"[]") -> Response:
+    return Response(body, media_type="application/json")
+
+
+def test_store_skips_pages_invalidated_while_read():
+    cache = ResponseCache(max_bytes=1 << 20, ttl=60)
+
+    generation = cache.generation()
+    # A write lands while the page is read from the database
+    cache.invalidate("team:a")
+    cache.store("stale", page(), ["team:a", "user:1"], generation)
+
+    generation = cache.generation()
+    cache.invalidate("team:b")
+    cache.store("fresh", page(), ["team:a"], generation)
+
+    assert cache.stats()["entries"] == 1
+    assert "fresh" in cache._entries
+
+
+def test_store_skips_when_invalidations_were_forgotten(monkeypatch):
+    monkeypatch.setattr(module, "MAX_INVALIDATED_TAGS", 2)
+    cache = ResponseCache(max_bytes=1 << 20, ttl=60)
+
+    generation = cache.generation()
+    for tag in ("team:a", "team:b", "team:c"):
+        cache.invalidate(tag)
+    # team:a's invalidation is no longer known, it may have been after the read
+    cache.store("key", page(), ["team:a"], generation)
+
+    assert cache.stats()["entries"] == 0